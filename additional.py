@@ -1,21 +1,24 @@
 import csv
 
-import numpy
-
+from aggregate import PerformanceAggregator
 from analyse import get_fasta_data_list, clean_up_strings, BASES, \
-    count_occurrence
+    BEST_MATCH_KEY, count_best_matches, count_occurrence
+from encoding import encode_sequences
 
 
 def score_motif(instances, motif):
-    score = 0
-    for i in range(len(instances)):
-        temp_score = 0
-        for j in range(len(instances[i]) - len(motif)):
-            new_score = sum(
-                [instances[i][j + k] == motif[k] for k in range(len(motif))])
-            temp_score = max(temp_score, new_score)
-        score += temp_score
-    return score, count_occurrence(instances, motif)
+    return score_motifs(instances, [motif])[0]
+
+
+def score_motifs(instances, motifs):
+    """
+    Scores all motifs at once (see analyse.count_best_matches)
+    :return: per motif its summed best number of matching bases per instance
+    and the number of instances it occurs in
+    """
+    return [(score, count_occurrence(instances, motif)) for score, motif in
+            zip(count_best_matches(encode_sequences(instances), motifs),
+                motifs)]
 
 
 def filter_motifs(collection):
@@ -40,7 +43,7 @@ def custom_max(elements):
 
 
 def print_max(instances, motifs):
-    scores = [(score_motif(instances, motif), motif) for motif in motifs]
+    scores = list(zip(score_motifs(instances, motifs), motifs))
     max_scores = custom_max(scores)
     length = len(motifs[0])
     num_instances = len(instances)
@@ -49,55 +52,71 @@ def print_max(instances, motifs):
             f"{max_score[1]} ({max_score[0][0] / (num_instances * length) * 100}%, {max_score[0][1]})")
 
 
-def print_avg(instances, motifs):
-    length = len(motifs[0])
+def print_avg(aggregator, length):
+    """
+    Prints the median of the match percentage of the best motif of the runs
+    :param aggregator: PerformanceAggregator the runs were added to
+    """
     print(length)
-    num_instances = len(instances)
-    scores = [score_motif(instances, motif)[0] / (num_instances * length) * 100
-              for motif in motifs]
-    avg_score = numpy.median(scores)
-    print(f"{avg_score}%")
+    _, _, median = aggregator.summary()[BEST_MATCH_KEY]
+    print(f"{median}%")
 
 
-def print_std(instances, motifs):
-    length = len(motifs[0])
+def print_std(aggregator, length):
+    """
+    Prints the standard deviation of the match percentage of the best motif
+    of the runs
+    :param aggregator: PerformanceAggregator the runs were added to
+    """
     print(length)
-    num_instances = len(instances)
-    scores = [score_motif(instances, motif)[0] / (num_instances * length) * 100
-              for motif in motifs]
-    std_score = numpy.std(scores)
-    print(f"{std_score}%")
-
-
-data_file_name = "testdata_16S_RNA.FASTA"
-temp_instances = get_fasta_data_list(data_file_name)
-instances = clean_up_strings(temp_instances)
-file_names = ["G.csv", "BOG.csv", "EM.csv", "BOEM.csv"]
-interval = [10, 15]
-length = 20
-num_instances = len(instances)
-
-for file_name in file_names:
-    print(file_name)
-    with open(file_name) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',', quotechar='|',
-                                quoting=csv.QUOTE_MINIMAL)
-        line_count = 0
-        motifs = list()
-        max_motifs = list()
-        for row in csv_reader:
-            line_count += 1
-            if line_count < interval[0] + 1:
-                continue
-            if line_count == interval[1] + 1:
-                break
-            new_motifs = filter_motifs(row[3].split('\''))
-            scores = [(score_motif(instances, motif), motif) for motif in
-                      new_motifs]
-            max_motif = list(custom_max(scores))[0][1]
-            motifs.extend(new_motifs)
-            max_motifs.append(max_motif)
-
-    print_max(instances, motifs)
-    print_avg(instances, max_motifs)
-    print_std(instances, max_motifs)
+    _, std, _ = aggregator.summary()[BEST_MATCH_KEY]
+    print(f"{std}%")
+
+
+def report(data_file_name, file_names, interval):
+    """
+    Prints for every performance sheet the best motifs of the runs in the
+    interval, and the median and standard deviation of the match percentage
+    of the best motif per run, which the runs stored in the sheet
+    :param data_file_name: The FASTA file the runs were done on
+    :param file_names: The performance sheets (e.g. written by
+    analyse.process_data), the runs in sheets without a header row of the
+    keys have no known match percentage
+    :param interval: The first and last run (exclusive) of the sheets to use
+    """
+    temp_instances = get_fasta_data_list(data_file_name)
+    instances = clean_up_strings(temp_instances)
+
+    for file_name in file_names:
+        print(file_name)
+        with open(file_name) as csv_file:
+            csv_reader = csv.reader(csv_file, delimiter=',', quotechar='|',
+                                    quoting=csv.QUOTE_MINIMAL)
+            line_count = 0
+            column = None
+            motifs = list()
+            aggregator = PerformanceAggregator()
+            for row in csv_reader:
+                # A header row gives the column of the match percentage for
+                # the runs after it
+                if BEST_MATCH_KEY in row:
+                    column = row.index(BEST_MATCH_KEY)
+                    continue
+                line_count += 1
+                if line_count < interval[0] + 1:
+                    continue
+                if line_count == interval[1] + 1:
+                    break
+                motifs.extend(filter_motifs(row[3].split('\'')))
+                if column is not None and column < len(row):
+                    aggregator.update({BEST_MATCH_KEY: float(row[column])})
+
+        print_max(instances, motifs)
+        if BEST_MATCH_KEY in aggregator.summary():
+            print_avg(aggregator, len(motifs[0]))
+            print_std(aggregator, len(motifs[0]))
+
+
+if __name__ == '__main__':
+    report("testdata_16S_RNA.FASTA", ["G.csv", "BOG.csv", "EM.csv", "BOEM.csv"],
+           [10, 15])
@@ -0,0 +1,192 @@
+# Statistics over many runs that are updated one run at a time
+#
+# Every statistic keeps a constant amount of numbers, no matter how many runs
+# it has seen, so a sweep can be summarized without storing or re-reading the
+# results of its runs.
+from numbers import Real
+
+import numpy
+
+
+class RunningMoments:
+    """
+    Mean and standard deviation with Welford's method
+
+    >>> moments = RunningMoments()
+    >>> for value in [2, 4, 4, 4, 5, 5, 7, 9]:
+    ...     moments.update(value)
+    >>> moments.mean, moments.std
+    (5.0, 2.0)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._squares = 0.0
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._squares += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        """
+        The population standard deviation, like numpy.std
+        """
+        if not self.count:
+            return 0.0
+        return (self._squares / self.count) ** 0.5
+
+
+class RunningQuantile:
+    """
+    Estimate of a quantile with the P-square algorithm, which keeps five
+    markers whose heights are moved towards the quantile of the values seen so
+    far. The first five values give the exact quantile.
+
+    >>> median = RunningQuantile()
+    >>> for value in [5, 1, 4, 2, 3]:
+    ...     median.update(value)
+    >>> median.value
+    3.0
+    >>> for value in range(6, 100):
+    ...     median.update(value)
+    >>> round(median.value)
+    50
+    """
+
+    def __init__(self, quantile=0.5):
+        self.quantile = quantile
+        self.count = 0
+        self._heights = list()
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * quantile, 1 + 4 * quantile,
+                         3 + 2 * quantile, 5]
+        self._increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def update(self, value):
+        self.count += 1
+        heights, positions = self._heights, self._positions
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        # The cell of the value, the extreme markers follow the extremes
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = max(i for i in range(4) if heights[i] <= value)
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the middle markers that are off their desired position by one
+        for i in range(1, 4):
+            offset = self._desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (
+                    offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (
+                            heights[i + step] - heights[i]) / (
+                                     positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        heights, positions = self._heights, self._positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+                (positions[i] - positions[i - 1] + step) *
+                (heights[i + 1] - heights[i]) /
+                (positions[i + 1] - positions[i]) +
+                (positions[i + 1] - positions[i] - step) *
+                (heights[i] - heights[i - 1]) /
+                (positions[i] - positions[i - 1]))
+
+    @property
+    def value(self):
+        if not self.count:
+            return float("nan")
+        if self.count <= 5:
+            return float(numpy.quantile(self._heights, self.quantile))
+        return float(self._heights[2])
+
+
+class RunningMax:
+    """
+    The largest value seen so far and the items that had it
+
+    >>> best = RunningMax()
+    >>> for item, value in [("AT", 2), ("GC", 3), ("TA", 3)]:
+    ...     best.update(item, value)
+    >>> best.value, sorted(best.items)
+    (3, ['GC', 'TA'])
+    """
+
+    def __init__(self):
+        self.value = None
+        self.items = set()
+
+    def update(self, item, value):
+        if self.value is None or value > self.value:
+            self.value = value
+            self.items = {item}
+        elif value == self.value:
+            self.items.add(item)
+
+
+class PerformanceAggregator:
+    """
+    Summarizes the performance dicts of runs (see analyse.get_performance):
+    the mean, standard deviation and median of every number in them, and the
+    motifs that occurred in the most strings
+
+    >>> aggregator = PerformanceAggregator()
+    >>> aggregator.update({"time": 1.0, "occurrences": {"AT": 2}}, "occurrences")
+    >>> aggregator.update({"time": 3.0, "occurrences": {"GC": 4}}, "occurrences")
+    >>> aggregator.summary()["time"]
+    (2.0, 1.0, 2.0)
+    >>> aggregator.most_occurring.items
+    {'GC'}
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self._moments = dict()
+        self._medians = dict()
+        self.most_occurring = RunningMax()
+
+    def update(self, performance_dict, occurrences_key=None):
+        """
+        :param performance_dict: The performance of one run
+        :param occurrences_key: The key of the dict with the amount of strings
+        every motif occurs in
+        """
+        self.runs += 1
+        for key, value in performance_dict.items():
+            if key == occurrences_key:
+                for motif, occurrences in value.items():
+                    self.most_occurring.update(motif, occurrences)
+            elif isinstance(value, Real):
+                if key not in self._moments:
+                    self._moments[key] = RunningMoments()
+                    self._medians[key] = RunningQuantile()
+                self._moments[key].update(float(value))
+                self._medians[key].update(float(value))
+
+    def summary(self):
+        """
+        :return: Dict with the mean, standard deviation and median of every
+        number of the runs
+        """
+        return {key: (moments.mean, moments.std, self._medians[key].value)
+                for key, moments in self._moments.items()}
@@ -2,16 +2,38 @@
 import csv
 import resource
 import time
+from collections import namedtuple
+from functools import partial
 
 import numpy
 
+from aggregate import PerformanceAggregator
+from dataset import Dataset
+from encoding import encode, encode_sequences
 from exmin import find_motif_exmin, best_of_exmin
 from gibbs import gibbs_sample, best_of_gibbs
-from scoring import get_motifs_score, get_total_motifs_score, \
-    get_frequency_matrix, score_sum, get_motifs_percentage, \
-    get_total_motifs_percentage
+from kernels import best_matches
+from kmers import pays_off
+from packed import MAX_WIDTH, best_window_matches, count_matches, pack, \
+    pack_windows
+from pvalues import score_to_pvalue
+from scoring import get_frequency_matrix, score_sum, score_pssm, \
+    score_pssm_log, add_pseudo_counts, freq_to_log_matrix
 
 BASES = ["A", "T", "C", "G"]
+NOLOG_PREFIX = "\033[96mNolog:\033[0m\033[32;1m"
+# The entry of the performance dict with the amount of strings every motif
+# occurs in
+OCCURRENCES_KEY = \
+    f'{NOLOG_PREFIX} Count of occurrences of all motifs in all strings'
+# The entry of the performance dict with the percentage of the bases of all
+# strings matched by the best motif
+BEST_MATCH_KEY = f'{NOLOG_PREFIX} Match percentage of the best motif'
+
+# The unique strings of a set, the amount of strings collapsed into each of
+# them and the index of each of them in the set
+CollapsedStrings = namedtuple("CollapsedStrings",
+                              ["strings", "weights", "indices"])
 
 
 def get_value(value: tuple):
@@ -95,12 +117,92 @@ def count_occurrence(instances, motif):
 
 
 def count_occurrences(instances, motifs):
+    if isinstance(instances, numpy.ndarray):
+        return count_encoded_occurrences(instances, motifs)
     ret_dict = dict()
     for motif in motifs:
         ret_dict[motif] = count_occurrence(instances, motif)
     return ret_dict
 
 
+def count_encoded_occurrences(encoded, motifs):
+    """
+    count_occurrences on encoded instances, the windows of every motif length
+    are packed once and looked up for all motifs of that length
+    :param: encoded: The encoded instances, one row per instance
+    :param: motifs: The motifs as strings
+    :returns: Dict with the amount of instances every motif occurs in
+    >>> from encoding import encode_sequences
+    >>> count_encoded_occurrences(encode_sequences(["ACGTA", "TTACG"]), ["GTA", "ACG", "CCC", "ACG"])
+    {'GTA': 1, 'ACG': 2, 'CCC': 0}
+    """
+    counts = dict()
+    for length in set(map(len, motifs)):
+        same_length = sorted({motif for motif in motifs if len(motif) == length})
+        if length > encoded.shape[1]:
+            counts.update((motif, 0) for motif in same_length)
+        elif length > MAX_WIDTH:
+            for motif in same_length:
+                matches = best_matches(encoded, encode(motif),
+                                       encoded.shape[1] - length + 1)
+                counts[motif] = int((matches == length).sum())
+        else:
+            # The motif every window is (when any), an instance counts once
+            # for every motif it has a window of. Sorted strings pack to
+            # sorted codes, as the codes follow the alphabet.
+            packed_motifs = numpy.array([pack(encode(motif))
+                                         for motif in same_length],
+                                        dtype=numpy.uint64)
+            windows = pack_windows(encoded, length)
+            found = numpy.minimum(numpy.searchsorted(packed_motifs, windows),
+                                  len(packed_motifs) - 1)
+            hits = packed_motifs[found] == windows
+            pairs = numpy.unique(numpy.nonzero(hits)[0] * len(packed_motifs) +
+                                 found[hits])
+            occurrences = numpy.bincount(pairs % len(packed_motifs),
+                                         minlength=len(packed_motifs))
+            counts.update(zip(same_length, occurrences.tolist()))
+    return {motif: counts[motif] for motif in motifs}
+
+
+def count_best_matches(encoded, motifs):
+    """
+    Per motif the summed largest amount of bases that match it in one window
+    of every instance, the last window of every instance is not compared
+    :param: encoded: The encoded instances, one row per instance
+    :param: motifs: The motifs as strings
+    :returns: List with the count of every motif
+    >>> count_best_matches(encode_sequences(["ACGTA", "TTACG"]), ["ACG", "TTA"])
+    [3, 3]
+    """
+    counts = [None] * len(motifs)
+    for length in set(map(len, motifs)):
+        indices = [i for i, motif in enumerate(motifs) if len(motif) == length]
+        num_windows = encoded.shape[1] - length
+        if length > MAX_WIDTH or num_windows <= 0:
+            sums = [best_matches(encoded, encode(motifs[i]), num_windows).sum()
+                    for i in indices]
+        else:
+            windows = pack_windows(encoded, length)[:, :num_windows]
+            sums = best_window_matches(
+                windows, [pack(encode(motifs[i])) for i in indices],
+                length).sum(axis=1)
+        for i, count in zip(indices, sums):
+            counts[i] = int(count)
+    return counts
+
+
+def get_best_match_percentage(encoded, motifs):
+    """
+    The percentage of the bases of all instances matched by the motif with the
+    most matches (see count_best_matches)
+    >>> get_best_match_percentage(encode_sequences(["ACGTA", "TTACG"]), ["ACG", "TTA"])
+    50.0
+    """
+    return max(count / (len(encoded) * len(motif)) * 100 for count, motif in
+               zip(count_best_matches(encoded, motifs), motifs))
+
+
 def update_performance_dict(_performance_dict, motifs_score, total_motifs_score,
                             prefix, occurrences=None):
     _performance_dict[
@@ -125,7 +227,8 @@ def update_performance_dict(_performance_dict, motifs_score, total_motifs_score,
     return _performance_dict
 
 
-def get_log_relative_performance(_performance_dict, motifs):
+def get_log_relative_performance(_performance_dict, motifs,
+                                 frequency_matrix=None):
     """
     This function will use the motifs that where found during
     the motif finding algorithm in log form, and generates data about it
@@ -133,17 +236,30 @@ def get_log_relative_performance(_performance_dict, motifs):
     new data
     :param: motifs: The motifs from the generated solution, will be compared
     with each other
+    :param: frequency_matrix: The frequency matrix of the motifs, when it is
+    already made
     :returns: The dict filled with data about the performance relative to the
     motifs that were found
     """
     prefix = "\033[96mLog:\033[0m\033[32;1m"
-    motifs_score = get_motifs_score(motifs)
-    total_motifs_score = get_total_motifs_score(motifs)
-    return update_performance_dict(_performance_dict, motifs_score,
-                                   total_motifs_score, prefix)
+    if frequency_matrix is None:
+        frequency_matrix = get_frequency_matrix(motifs)
+    scoring_matrix = freq_to_log_matrix(add_pseudo_counts(frequency_matrix))
+    motifs_score = {motif: score_pssm_log(motif, scoring_matrix)
+                    for motif in motifs}
+    total_motifs_score = sum(list(motifs_score.values()))
+    _performance_dict = update_performance_dict(_performance_dict,
+                                                motifs_score,
+                                                total_motifs_score, prefix)
+    # How likely a random window (uniform bases) scores at least as good as
+    # the best motif
+    _performance_dict[f'{prefix} P-value of the best motif score'] = \
+        score_to_pvalue(scoring_matrix, min(motifs_score.values()))
+    return _performance_dict
 
 
-def get_nolog_relative_performance(_performance_dict, motifs, instances):
+def get_nolog_relative_performance(_performance_dict, motifs, instances,
+                                   frequency_matrix=None):
     """
     This function will use the motifs that where found during
     the motif finding algorithm in percentage form, and generates data about it
@@ -151,15 +267,22 @@ def get_nolog_relative_performance(_performance_dict, motifs, instances):
     new data
     :param: motifs: The motifs from the generated solution, will be compared
     with each other
+    :param: instances: The instances (or encoded instances) the occurrences
+    of the motifs are counted in
+    :param: frequency_matrix: The frequency matrix of the motifs, when it is
+    already made
     :returns: The dict filled with data about the performance relative to the
     motifs that were found
     """
-    prefix = "\033[96mNolog:\033[0m\033[32;1m"
-    motifs_percentage = get_motifs_percentage(motifs)
-    total_motifs_percentage = get_total_motifs_percentage(motifs)
+    if frequency_matrix is None:
+        frequency_matrix = get_frequency_matrix(motifs)
+    motifs_percentage = {motif: score_pssm(motif, frequency_matrix)
+                         for motif in motifs}
+    total_motifs_percentage = numpy.prod(list(motifs_percentage.values()))
     occurrences = count_occurrences(instances, motifs)
     return update_performance_dict(_performance_dict, motifs_percentage,
-                                   total_motifs_percentage, prefix, occurrences)
+                                   total_motifs_percentage, NOLOG_PREFIX,
+                                   occurrences)
 
 
 def get_solution_relative_performance(_performance_dict, motifs, solution):
@@ -180,8 +303,14 @@ def get_solution_relative_performance(_performance_dict, motifs, solution):
     motifs_dict = dict()
     # Calculate the scoring in the case of having a solution and compare to the
     # solution
-    for motif in motifs:
-        motifs_dict[motif] = score_sum(motif, scoring_matrix)
+    if len(motifs[0]) <= min(MAX_WIDTH, len(solution)):
+        # With the frequency matrix of the solution, score_sum is one plus the
+        # amount of bases the motif has in common with the solution
+        for motif, matches in zip(motifs, count_matches(motifs, solution)):
+            motifs_dict[motif] = 1.0 + int(matches)
+    else:
+        for motif in motifs:
+            motifs_dict[motif] = score_sum(motif, scoring_matrix)
     total_motifs_score = sum(list(motifs_dict.values()))
     return update_performance_dict(_performance_dict, motifs_dict,
                                    total_motifs_score, prefix)
@@ -225,17 +354,24 @@ def get_performance(solution, instances, func, *args, **kwargs) -> dict:
     performance_dict = get_general_performance(performance_dict, time_start,
                                                resource, count)
 
-    # This part is when we do not have a solution
+    # This part is when we do not have a solution, both parts use the same
+    # frequency matrix
+    frequency_matrix = get_frequency_matrix(motifs)
     performance_dict = get_nolog_relative_performance(performance_dict, motifs,
-                                                      instances)
-    performance_dict = get_log_relative_performance(performance_dict, motifs)
+                                                      instances,
+                                                      frequency_matrix)
+    performance_dict = get_log_relative_performance(performance_dict, motifs,
+                                                    frequency_matrix)
 
     # Perform this part only when there is a solution known
-    if solution is None:
-        return performance_dict
-    performance_dict = get_solution_relative_performance(performance_dict,
-                                                         motifs, solution)
-
+    if solution is not None:
+        performance_dict = get_solution_relative_performance(performance_dict,
+                                                             motifs, solution)
+
+    if not isinstance(instances, numpy.ndarray):
+        instances = encode_sequences(instances)
+    performance_dict[BEST_MATCH_KEY] = get_best_match_percentage(instances,
+                                                                 motifs)
     return performance_dict
 
 
@@ -256,6 +392,43 @@ def print_performance(implementation_name, performance_dict):
         print(f"\033[32;1m{item[0]}: \033[0m\033[3m{item[1]}\033[0m")
 
 
+def print_summary(name, aggregator):
+    """
+    Prints the statistics over all runs of an implementation
+    :param: name: The name of the runs
+    :param: aggregator: The PerformanceAggregator the runs were added to
+    """
+    print(f"\033[36;1mSummary of {aggregator.runs} runs of {name}")
+    for key, (mean, std, median) in aggregator.summary().items():
+        print(f"\033[32;1m{key}: \033[0m\033[3mmean {mean}, standard "
+              f"deviation {std}, median {median}\033[0m")
+    print(f"\033[32;1mMost occurring motifs: \033[0m\033[3m"
+          f"{sorted(aggregator.most_occurring.items)} "
+          f"({aggregator.most_occurring.value})\033[0m")
+
+
+def report_performances(tasks, performance_dicts):
+    """
+    Prints and stores the performance of every run as it comes in, and prints
+    a summary per implementation and motif length once all runs are done
+    :param: tasks: The (name, sheet, function, arguments, keyword arguments) of
+    every run, the motif length is the first argument
+    :param: performance_dicts: The performance dict of every run, in the order
+    of the tasks
+    """
+    aggregators = dict()
+    for (name, sheet, _, args, _), performance_dict in zip(tasks,
+                                                           performance_dicts):
+        print_performance(name, performance_dict)
+        create_performance_sheet(sheet, performance_dict)
+        key = name, args[0]
+        if key not in aggregators:
+            aggregators[key] = PerformanceAggregator()
+        aggregators[key].update(performance_dict, OCCURRENCES_KEY)
+    for (name, length), aggregator in aggregators.items():
+        print_summary(f"{name} (motif length {length})", aggregator)
+
+
 def create_performance_sheet(file_name, performance_dict):
     """
     This will create a performance sheet and will append the data from the
@@ -265,8 +438,19 @@ def create_performance_sheet(file_name, performance_dict):
     :returns: nothing
     """
     with open(file_name, 'a+', newline='') as csvfile:
+        # The runs follow a header row with their keys, so the columns can be
+        # found by their key. A run with other keys (e.g. with a solution)
+        # starts a new header row.
+        csvfile.seek(0)
+        header = None
+        for row in csv.reader(csvfile, delimiter=',', quotechar='|',
+                              quoting=csv.QUOTE_MINIMAL):
+            if BEST_MATCH_KEY in row:
+                header = row
         filewriter = csv.writer(csvfile, delimiter=',',
                                 quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        if header != list(performance_dict.keys()):
+            filewriter.writerow(list(performance_dict.keys()))
         filewriter.writerow(list(performance_dict.values()))
 
 
@@ -371,9 +555,152 @@ def clean_up_strings(strings: list) -> list:
     return strings
 
 
-def process_data(data_file_name, solution, runs, active_algo):
+def collapse_duplicates(strings, max_mismatches=0):
+    """
+    Collapses copies of the same string into one unique string, which gets the
+    amount of copies as weight. The algorithms give the same results on the
+    unique strings with their weights as on all strings, while they only do
+    the work once per unique string.
+    :param: strings: Strings of the same length (see clean_up_strings)
+    :param: max_mismatches: When given, a string that differs in at most this
+    many positions from an earlier unique string is counted as a copy of it
+    :returns: CollapsedStrings
+    >>> collapsed = collapse_duplicates(["ACGT", "TTTT", "ACGT"])
+    >>> collapsed.strings, collapsed.weights.tolist(), collapsed.indices.tolist()
+    (['ACGT', 'TTTT'], [2, 1], [0, 1])
+    >>> collapse_duplicates(["ACGT", "TTTT", "ACGA"], 1).weights.tolist()
+    [2, 1]
+    """
+    unique = dict()
+    weights = list()
+    indices = list()
+    # The encoded unique strings, to look for near duplicates
+    encoded = None
+    if max_mismatches:
+        encoded = numpy.empty((len(strings), len(strings[0])),
+                              dtype=numpy.uint8)
+    for i, string in enumerate(strings):
+        if string not in unique and max_mismatches:
+            codes = numpy.frombuffer(string.encode(), dtype=numpy.uint8)
+            if len(unique):
+                mismatches = (encoded[:len(unique)] != codes).sum(axis=1)
+                closest = int(mismatches.argmin())
+                if mismatches[closest] <= max_mismatches:
+                    weights[closest] += 1
+                    continue
+            encoded[len(unique)] = codes
+        if string in unique:
+            weights[unique[string]] += 1
+            continue
+        unique[string] = len(unique)
+        weights.append(1)
+        indices.append(i)
+    return CollapsedStrings(list(unique), numpy.array(weights),
+                            numpy.array(indices))
+
+
+def expand_weighted(items, weights):
+    """
+    Repeats every item as often as its weight
+    >>> expand_weighted(["AC", "GT"], [2, 1])
+    ['AC', 'AC', 'GT']
+    """
+    if weights is None:
+        return items
+    return [item for item, weight in zip(items, weights)
+            for _ in range(weight)]
+
+
+def run_weighted(func, instances, *args, weights, **kwargs):
+    """
+    Runs an algorithm on unique instances with their weights, the motifs it
+    returns are repeated as often as their instance
+    """
+    motifs, count = func(instances, *args, weights=weights, **kwargs)
+    return expand_weighted(motifs, weights), count
+
+
+def get_eligible(dataset, motif_width, dust):
+    """
+    The start positions the runs on the dataset may use, all when no DUST
+    threshold is given
+    """
+    return None if dust is None else dataset.eligible(motif_width, dust)
+
+
+def uses_kmer_codes(dataset, motif_width):
+    """
+    Whether the runs on the dataset score the windows with a table, then they
+    are given the k-mer codes cached by the dataset
+    """
+    return pays_off(dataset.encoded.shape[1] - motif_width + 1, motif_width,
+                    cached=True)
+
+
+def add_kmer_codes(dataset, motif_width, kwargs):
+    """
+    The keyword arguments of a run with the k-mer codes of the dataset filled
+    in, when the run takes them and they pay off
+    """
+    if "codes" not in kwargs or not uses_kmer_codes(dataset, motif_width):
+        return kwargs
+    return dict(kwargs, codes=dataset.kmer_codes(motif_width))
+
+
+# The algorithms that can be compared: name in the report, performance sheet,
+# function, whether it takes an amount of restarts, whether it takes the
+# k-mer codes of the windows and whether it runs on collapsed copies with
+# their weights. Gibbs leaves all copies of an instance out together and
+# gives them one site, which is not the sampler of the expanded data, so it
+# runs on all instances.
+ALGORITHMS = [("Gibbs", 'G.csv', gibbs_sample, False, True, False),
+              ("Best of gibbs", 'BOG.csv', best_of_gibbs, True, True, False),
+              ("Expectation minimization", 'EM.csv', find_motif_exmin, False,
+               False, True),
+              ("Best of expectation minimization", 'BOEM.csv', best_of_exmin,
+               True, False, True),
+              ("Racing best of expectation minimization", 'RBOEM.csv',
+               partial(best_of_exmin, racing=True), True, False, True)]
+
+
+def process_data(data_file_name, solution, runs, active_algo,
+                 background_order=None, lengths=(10, 20), iterations=50,
+                 workers=1, confidence=None, collapse=None, dust=None):
+    """
+    Runs the active algorithms on the data for every motif length, prints their
+    performance and appends it to their performance sheet
+    :param: active_algo: A bool per entry of ALGORITHMS whether it is run
+    :param: lengths: The motif lengths to search for
+    :param: iterations: The amount of restarts of the best of algorithms, the
+    maximum when confidence is given
+    :param: confidence: When given, the best of algorithms stop restarting once
+    their best solution has been found this many times
+    :param: workers: The amount of processes the runs are divided over
+    :param: collapse: When given, copies of the same instance are only
+    processed once, instances differing in at most this many positions count
+    as copies (see collapse_duplicates)
+    :param: dust: When given, the motif may not start in windows of low
+    complexity, those with a DUST score above this threshold (see
+    complexity.mask_low_complexity)
+    """
     temp_instances = get_fasta_data_list(data_file_name)
     instances = clean_up_strings(temp_instances)
+    # The background model is estimated once and shared by all the runs, when
+    # no order is given the algorithms use their own background estimate
+    dataset = Dataset(instances)
+    # The algorithms that take weights run on one copy of every instance, the
+    # statistics are counted in all instances
+    collapsed_dataset = None
+    weights = None
+    if collapse is not None:
+        collapsed = collapse_duplicates(instances, collapse)
+        weights = collapsed.weights
+        tables = dict()
+        if background_order is not None:
+            tables[background_order] = dataset.background_log_probabilities(
+                background_order)[collapsed.indices]
+        collapsed_dataset = Dataset.from_encoded(
+            dataset.encoded[collapsed.indices], tables)
     # instances = [
     #     "CAAAACCCTCAAATACATTTTAGAAACACAATTTCAGGATATTAAAAGTTAAATTCATCTAGTTATACAA",
     #     "TCTTTTCTGAATCTGAATAAATACTTTTATTCTGTAGATGGTGGCTGTAGGAATCTGTCACACAGCATGA",
@@ -382,54 +709,107 @@ def process_data(data_file_name, solution, runs, active_algo):
     #     "TCACCATCAAACCTGAATCAAGGCAATGAGCAGGTATACATAGCCTGGATAAGGAAACCAAGGCAATGAG"]
     print(len(instances[0]))
 
-    for length in range(10, 21, 10):
+    tasks = list()
+    for length in lengths:
         for _ in range(runs):
-            iterations = 50
-
-            if active_algo[0]:
-                gibbs_performance_dict = get_performance(solution, instances,
-                                                         gibbs_sample,
-                                                         instances,
-                                                         length)
-                print_performance("Gibbs", gibbs_performance_dict)
-                create_performance_sheet('G.csv', gibbs_performance_dict)
-
-            if active_algo[1]:
-                best_of_gibbs_performance_dict = get_performance(solution,
-                                                                 instances,
-                                                                 best_of_gibbs,
-                                                                 instances,
-                                                                 length,
-                                                                 iterations)
-                print_performance("Best of gibbs",
-                                  best_of_gibbs_performance_dict)
-                create_performance_sheet('BOG.csv',
-                                         best_of_gibbs_performance_dict)
-
-            if active_algo[2]:
-                em_dict = get_performance(solution, instances, find_motif_exmin,
-                                          instances,
-                                          length)
-
-                print_performance("Expectation minimization", em_dict)
-                create_performance_sheet('EM.csv', em_dict)
-
-            if active_algo[3]:
-                best_of_em_performance_dict = get_performance(solution,
-                                                              instances,
-                                                              best_of_exmin,
-                                                              instances, length,
-                                                              iterations)
-                print_performance("Best of expectation minimization",
-                                  best_of_em_performance_dict)
-                create_performance_sheet('BOEM.csv',
-                                         best_of_em_performance_dict)
+            for active, (name, sheet, func, restarts, codes,
+                         weighted) in zip(active_algo, ALGORITHMS):
+                if not active:
+                    continue
+                # The instances, background, eligible start positions and
+                # k-mer codes are added by the process that runs the task
+                kwargs = dict()
+                if codes:
+                    kwargs["codes"] = None
+                if weighted and weights is not None:
+                    func = partial(run_weighted, func)
+                    kwargs["weights"] = weights
+                if restarts:
+                    args = (length, iterations)
+                    kwargs["confidence"] = confidence
+                else:
+                    args = (length,)
+                tasks.append((name, sheet, func, args, kwargs))
+
+    if workers == 1:
+        performance_dicts = (
+            run_task(solution, dataset, collapsed_dataset, background_order,
+                     dust, func, args, kwargs)
+            for _, _, func, args, kwargs in tasks)
+        report_performances(tasks, performance_dicts)
+        return
+
+    # The runs are independent, the results are reported in the same order
+    # as they would be without workers. The data is shared with the workers
+    # instead of being pickled into every task.
+    from concurrent.futures import ProcessPoolExecutor
+    from contextlib import nullcontext
+
+    from shared import share_dataset
+
+    background_orders = [] if background_order is None else [background_order]
+    takes_codes = any(active and codes for active, (_, _, _, _, codes, _) in
+                      zip(active_algo, ALGORITHMS))
+    kmer_widths = [length for length in lengths
+                   if takes_codes and uses_kmer_codes(dataset, length)]
+    with share_dataset(dataset, background_orders, kmer_widths) as shared, \
+            (nullcontext() if collapsed_dataset is None else
+             share_dataset(collapsed_dataset, background_orders)) \
+            as shared_collapsed, \
+            ProcessPoolExecutor(workers, initializer=_attach_worker_dataset,
+                                initargs=(shared, shared_collapsed)) \
+            as executor:
+        futures = [executor.submit(_get_worker_performance, solution,
+                                   background_order, dust, func, args, kwargs)
+                   for _, _, func, args, kwargs in tasks]
+        report_performances(tasks, (future.result() for future in futures))
+
+
+def run_task(solution, dataset, collapsed_dataset, background_order, dust,
+             func, args, kwargs):
+    """
+    Runs a task of process_data on the collapsed dataset when it takes
+    weights, else on the dataset, the statistics are counted in the dataset
+    :return: The performance dict of the run
+    """
+    run_dataset = collapsed_dataset if "weights" in kwargs else dataset
+    background = None
+    if background_order is not None:
+        background = run_dataset.background_log_probabilities(
+            background_order)
+    # The algorithms and the statistics read the encoded arrays, only the
+    # motifs they find are decoded
+    return get_performance(solution, dataset.encoded, func,
+                           run_dataset.encoded, *args, background=background,
+                           eligible=get_eligible(run_dataset, args[0], dust),
+                           **add_kmer_codes(run_dataset, args[0], kwargs))
+
+
+# The dataset of a worker process of process_data and its collapsed copies,
+# when there are
+_worker_dataset = None
+_worker_collapsed_dataset = None
+
+
+def _attach_worker_dataset(shared, shared_collapsed):
+    global _worker_dataset, _worker_collapsed_dataset
+    from shared import attach_dataset
+
+    _worker_dataset = attach_dataset(shared)
+    if shared_collapsed is not None:
+        _worker_collapsed_dataset = attach_dataset(shared_collapsed)
+
+
+def _get_worker_performance(solution, background_order, dust, func, args,
+                            kwargs):
+    return run_task(solution, _worker_dataset, _worker_collapsed_dataset,
+                    background_order, dust, func, args, kwargs)
 
 
 if __name__ == '__main__':
     solution = None  # "TATAAAAA"
     # Variables to turn on and off running parts of the algorithm
-    active_algo = [True, True, True, True]
+    active_algo = [True, True, True, True, False]
     # Amount of runs
     runs = 5
     process_data("testdata_16S_RNA.FASTA", solution, runs, active_algo)
@@ -0,0 +1,79 @@
+# Markov background model of a set of DNA strings
+from collections import namedtuple
+
+import numpy
+
+from encoding import encode_sequences
+
+BASES = 4
+
+# log_tables[m] holds the log probability of every base (columns) given the m
+# bases before it (rows, the context read as a base 4 number), for every order
+# m up to the order of the model
+BackgroundModel = namedtuple("BackgroundModel", ["order", "log_tables"])
+
+
+def get_contexts(encoded, order):
+    """
+    Calculates the context code of every position that has order bases in front
+    of it, the code of the bases x1..xm is x1 * 4^(m-1) + ... + xm
+    :param encoded: the encoded set of dna strings
+    :param order: amount of bases in the context
+    :return: array of shape (number of sequences, sequence length - order)
+
+    >>> get_contexts(encode_sequences(["ACGT"]), 2).tolist()
+    [[1, 6]]
+    """
+    length = encoded.shape[1]
+    contexts = numpy.zeros((len(encoded), length - order), dtype=numpy.int64)
+    for i in range(order):
+        contexts = contexts * BASES + encoded[:, i:length - order + i]
+    return contexts
+
+
+def estimate_background(sequences, order=0):
+    """
+    Estimates a Markov background model of the given order from the data, every
+    count gets a pseudocount of one
+    :param sequences: the set of dna strings (or the encoded set)
+    :param order: the Markov order, 0 only looks at the base composition
+    :return: BackgroundModel with a table for every order up to the given one
+
+    >>> model = estimate_background(["AAAC"], 0)
+    >>> numpy.exp(model.log_tables[0]).round(3).tolist()
+    [[0.5, 0.25, 0.125, 0.125]]
+    """
+    encoded = encode_sequences(sequences)
+    log_tables = list()
+    for m in range(order + 1):
+        contexts = get_contexts(encoded, m)
+        following = encoded[:, m:].astype(numpy.int64)
+        counts = numpy.bincount((contexts * BASES + following).ravel(),
+                                minlength=BASES ** (m + 1))
+        counts = counts.reshape(BASES ** m, BASES) + 1
+        log_tables.append(
+            numpy.log(counts / counts.sum(axis=1, keepdims=True)))
+    return BackgroundModel(order, log_tables)
+
+
+def position_log_probabilities(sequences, model):
+    """
+    Gives the log background probability of every base in the data, the first
+    bases of a string use the longest context that is available
+    :param sequences: the set of dna strings (or the encoded set)
+    :param model: BackgroundModel (e.g. obtained with estimate_background)
+    :return: array of the same shape as the encoded set
+
+    >>> model = estimate_background(["AAAC"], 1)
+    >>> numpy.exp(position_log_probabilities(["AAC"], model)).round(3).tolist()
+    [[0.5, 0.429, 0.286]]
+    """
+    encoded = encode_sequences(sequences)
+    length = encoded.shape[1]
+    log_probabilities = numpy.empty(encoded.shape)
+    for m in range(min(model.order, length) + 1):
+        contexts = get_contexts(encoded, m)
+        columns = slice(m, m + 1) if m < model.order else slice(m, length)
+        log_probabilities[:, columns] = model.log_tables[m][
+            contexts[:, :columns.stop - m], encoded[:, columns]]
+    return log_probabilities
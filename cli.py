@@ -0,0 +1,175 @@
+# Command line entry point: python -m cli {discover,report,benchmark,twostage} ...
+#
+# Only argparse is imported up front, NumPy and the algorithms are imported by
+# the subcommand that needs them so short jobs start fast.
+import argparse
+import sys
+
+ALGORITHM_NAMES = ["gibbs", "best_of_gibbs", "em", "best_of_em",
+                   "best_of_em_racing"]
+SHEETS = ["G.csv", "BOG.csv", "EM.csv", "BOEM.csv", "RBOEM.csv"]
+
+
+def get_active_algo(algorithms):
+    """
+    Converts the chosen algorithm names to the active_algo list of
+    analyse.process_data
+    >>> get_active_algo(["em", "gibbs"])
+    [True, False, True, False, False]
+    """
+    return [name in algorithms for name in ALGORITHM_NAMES]
+
+
+def discover(arguments):
+    from analyse import process_data
+
+    process_data(arguments.data, arguments.solution, arguments.runs,
+                 get_active_algo(arguments.algorithms),
+                 background_order=arguments.background_order,
+                 lengths=arguments.width, iterations=arguments.iterations,
+                 workers=arguments.workers, confidence=arguments.confidence,
+                 collapse=arguments.collapse, dust=arguments.dust)
+
+
+def report(arguments):
+    from additional import report as print_report
+
+    print_report(arguments.data, arguments.sheets, arguments.interval)
+
+
+def benchmark(arguments):
+    import time
+
+    from analyse import ALGORITHMS, get_fasta_data_list, clean_up_strings
+
+    instances = clean_up_strings(get_fasta_data_list(arguments.data))
+    for active, (name, _, func, restarts, _, _) in zip(
+            get_active_algo(arguments.algorithms), ALGORITHMS):
+        if not active:
+            continue
+        for length in arguments.width:
+            args = (instances, length, arguments.iterations) if restarts else (
+                instances, length)
+            kwargs = dict(
+                confidence=arguments.confidence) if restarts else dict()
+            times = list()
+            for _ in range(arguments.runs):
+                time_start = time.perf_counter()
+                try:
+                    func(*args, **kwargs)
+                except Exception as e:
+                    print(e)
+                    continue
+                times.append(time.perf_counter() - time_start)
+            if times:
+                print(f"{name} (width {length}): {min(times):.3f}s best, "
+                      f"{sum(times) / len(times):.3f}s average over "
+                      f"{len(times)} runs")
+
+
+def two_stage(arguments):
+    from analyse import get_fasta_data_list, clean_up_strings
+    from twostage import compare_with_full
+
+    instances = clean_up_strings(get_fasta_data_list(arguments.data))
+    for length in arguments.width:
+        quality = compare_with_full(
+            instances, length, arguments.iterations, arguments.algorithm,
+            fraction=arguments.fraction, stratified=arguments.stratified,
+            candidates=arguments.candidates,
+            refine_iterations=arguments.refine_iterations)
+        print(f"{arguments.algorithm} (width {length}): score "
+              f"{quality.two_stage_score} of {quality.full_score} "
+              f"({quality.quality_kept:.1%} kept) in "
+              f"{quality.two_stage_time:.3f}s instead of "
+              f"{quality.full_time:.3f}s ({quality.time_saved:.1%} saved)")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m cli", description="Motif finding with gibbs sampling "
+                                          "and expectation maximization")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    discover_parser = subparsers.add_parser(
+        "discover", help="run the algorithms and append their performance to "
+                         "the performance sheets")
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="time the algorithms without writing sheets")
+    for subparser in (discover_parser, benchmark_parser):
+        subparser.add_argument("data", help="FASTA file with the sequences")
+        subparser.add_argument("-w", "--width", type=int, nargs="+",
+                               default=[10, 20], help="motif widths")
+        subparser.add_argument("-r", "--runs", type=int, default=5,
+                               help="runs per algorithm and width")
+        subparser.add_argument("-a", "--algorithms", nargs="+",
+                               choices=ALGORITHM_NAMES,
+                               default=ALGORITHM_NAMES)
+        subparser.add_argument("-i", "--iterations", type=int, default=50,
+                               help="(maximum) restarts of the best of "
+                                    "algorithms, the restarts that start "
+                                    "the race of best_of_em_racing")
+        subparser.add_argument("-c", "--confidence", type=int,
+                               help="stop restarting once the best solution "
+                                    "has been found this many times")
+    discover_parser.add_argument("-j", "--workers", type=int, default=1,
+                                 help="processes to divide the runs over")
+    discover_parser.add_argument("-s", "--solution",
+                                 help="known motif to compare against")
+    discover_parser.add_argument("-b", "--background-order", type=int,
+                                 help="Markov order of a shared background "
+                                      "model")
+    discover_parser.add_argument("--collapse", type=int, metavar="MISMATCHES",
+                                 help="process copies of a sequence once, "
+                                      "sequences differing in at most "
+                                      "MISMATCHES positions count as copies")
+    discover_parser.add_argument("--dust", type=float, metavar="THRESHOLD",
+                                 help="don't let motifs start in windows of "
+                                      "low complexity, those with a DUST "
+                                      "score above THRESHOLD (e.g. 1.0)")
+    discover_parser.set_defaults(func=discover)
+    benchmark_parser.set_defaults(func=benchmark)
+
+    two_stage_parser = subparsers.add_parser(
+        "twostage", help="search on a subsample, refine the best motifs on "
+                         "all sequences and compare with searching on all "
+                         "sequences")
+    two_stage_parser.add_argument("data",
+                                  help="FASTA file with the sequences")
+    two_stage_parser.add_argument("-w", "--width", type=int, nargs="+",
+                                  default=[10, 20], help="motif widths")
+    two_stage_parser.add_argument("-a", "--algorithm",
+                                  choices=["exmin", "gibbs"], default="exmin")
+    two_stage_parser.add_argument("-i", "--iterations", type=int, default=50,
+                                  help="restarts on the subsample and on all "
+                                       "sequences")
+    two_stage_parser.add_argument("-f", "--fraction", type=float, default=0.2,
+                                  help="fraction of the sequences in the "
+                                       "subsample")
+    two_stage_parser.add_argument("--stratified", action="store_true",
+                                  help="stratify the subsample by GC content")
+    two_stage_parser.add_argument("--candidates", type=int, default=3,
+                                  help="motifs of the subsample to refine")
+    two_stage_parser.add_argument("--refine-iterations", type=int, default=5,
+                                  help="EM iterations or gibbs sweeps per "
+                                       "motif on all sequences")
+    two_stage_parser.set_defaults(func=two_stage)
+
+    report_parser = subparsers.add_parser(
+        "report", help="summarize the performance sheets")
+    report_parser.add_argument("data", help="FASTA file the runs were done on")
+    report_parser.add_argument("--sheets", nargs="+", default=SHEETS)
+    report_parser.add_argument("--interval", type=int, nargs=2,
+                               default=[10, 15],
+                               help="first and last row (exclusive) to use")
+    report_parser.set_defaults(func=report)
+    return parser
+
+
+def main(argv=None):
+    arguments = get_parser().parse_args(argv)
+    arguments.func(arguments)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
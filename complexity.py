@@ -0,0 +1,71 @@
+# Masking of low-complexity windows (poly-A, dinucleotide repeats, ...)
+#
+# Such windows score well on almost any motif that is rich in their bases, but
+# they are not the motifs we are looking for. Windows are scored DUST-style:
+# the more often the triplets of a window repeat, the higher its score. The
+# windows scoring above a threshold are made ineligible as start position of
+# the motif.
+import numpy
+
+from kmers import kmer_codes
+
+# Random windows score about (width - 2) / 128, a poly-A window of width 10
+# scores 4 and a dinucleotide repeat of width 10 scores 1.7
+DUST_THRESHOLD = 1.0
+
+
+def dust_scores(encoded, width):
+    """
+    The DUST score of every window: sum over the triplets of c * (c - 1) / 2
+    with c the amount of times the triplet occurs in the window, divided by
+    the amount of triplets in the window minus one. Every window takes the
+    same amount of work, whatever its width. Windows narrower than 4 bases
+    have at most one triplet, nothing repeats in them and they score 0.
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param width: The length of the windows
+    :return: Array of shape (number of sequences, number of windows)
+
+    >>> dust_scores(numpy.zeros((1, 6), dtype=numpy.uint8), 5).tolist()
+    [[1.5, 1.5]]
+    >>> dust_scores(numpy.array([[0, 1, 2, 3, 0, 1]], dtype=numpy.uint8), 5).tolist()
+    [[0.0, 0.0]]
+    >>> dust_scores(numpy.zeros((1, 4), dtype=numpy.uint8), 3).tolist()
+    [[0.0, 0.0]]
+    """
+    num_triplets = width - 2
+    num_windows = encoded.shape[1] - width + 1
+    scores = numpy.zeros((len(encoded), max(num_windows, 0)))
+    if num_windows <= 0 or num_triplets < 2:
+        return scores
+    codes = kmer_codes(encoded, 3)
+    # The count of a triplet in every window follows from the cumulative count
+    # of the triplet along the sequence
+    cumulative = numpy.zeros((len(encoded), codes.shape[1] + 1),
+                             dtype=numpy.int64)
+    for triplet in numpy.unique(codes):
+        numpy.cumsum(codes == triplet, axis=1, out=cumulative[:, 1:])
+        counts = cumulative[:, num_triplets:] - cumulative[:, :num_windows]
+        scores += counts * (counts - 1) / 2
+    return scores / (num_triplets - 1)
+
+
+def mask_low_complexity(encoded, motif_width, threshold=DUST_THRESHOLD,
+                        eligible=None):
+    """
+    Makes every start position of which the motif window has a DUST score
+    above the threshold ineligible
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param motif_width: The length for the motif
+    :param threshold: The highest DUST score an eligible window may have
+    :param eligible: Bool matrix with the start positions that were eligible
+    before, all when not given
+    :return: Bool matrix with the eligible start positions
+
+    >>> from encoding import encode_sequences
+    >>> mask_low_complexity(encode_sequences(["ACGTTGCAAAAAAAAAA"]), 8).astype(int).tolist()
+    [[1, 1, 1, 1, 1, 0, 0, 0, 0, 0]]
+    """
+    masked = dust_scores(encoded, motif_width) <= threshold
+    if eligible is not None:
+        masked &= eligible
+    return masked
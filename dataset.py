@@ -0,0 +1,113 @@
+# A set of DNA strings together with the tables derived from it
+from background import estimate_background, position_log_probabilities
+from complexity import mask_low_complexity
+from encoding import decode_sequences, encode_sequences
+from kmers import kmer_codes
+
+
+class Dataset:
+    """
+    Encoded set of DNA strings of the same length. Tables that are derived from
+    the data (e.g. the background model) are computed the first time they are
+    asked for and cached, so repeated runs on the same data don't redo them.
+
+    >>> dataset = Dataset(["ACGT", "AACC"])
+    >>> dataset.encoded.tolist()
+    [[0, 1, 2, 3], [0, 0, 1, 1]]
+    >>> dataset.background_log_probabilities(1) is dataset.background_log_probabilities(1)
+    True
+    """
+
+    def __init__(self, sequences):
+        self._sequences = list(sequences)
+        self.encoded = encode_sequences(self._sequences)
+        self._backgrounds = dict()
+        self._background_log_probabilities = dict()
+        self._kmer_codes = dict()
+        self._eligible = dict()
+
+    @classmethod
+    def from_encoded(cls, encoded, background_log_probabilities=None,
+                     kmer_codes=None):
+        """
+        Wraps data that is already encoded (e.g. attached from shared memory)
+        without copying it, the strings are only decoded when asked for
+        :param encoded: uint8 array, one row per string
+        :param background_log_probabilities: dict of the already computed
+        background_log_probabilities per order
+        :param kmer_codes: dict of the already computed kmer_codes per width
+        >>> Dataset.from_encoded(Dataset(["ACGT"]).encoded).sequences
+        ['ACGT']
+        """
+        dataset = cls.__new__(cls)
+        dataset._sequences = None
+        dataset.encoded = encoded
+        dataset._backgrounds = dict()
+        dataset._background_log_probabilities = dict(
+            background_log_probabilities or dict())
+        dataset._kmer_codes = dict(kmer_codes or dict())
+        dataset._eligible = dict()
+        return dataset
+
+    @property
+    def sequences(self):
+        if self._sequences is None:
+            self._sequences = decode_sequences(self.encoded)
+        return self._sequences
+
+    def __len__(self):
+        return len(self.encoded)
+
+    def background(self, order=0):
+        """
+        :param order: Markov order of the background model
+        :return: the BackgroundModel of this data
+        """
+        if order not in self._backgrounds:
+            self._backgrounds[order] = estimate_background(self.encoded, order)
+        return self._backgrounds[order]
+
+    def background_log_probabilities(self, order=0):
+        """
+        :param order: Markov order of the background model
+        :return: the log background probability of every base in the data
+        """
+        if order not in self._background_log_probabilities:
+            self._background_log_probabilities[order] = \
+                position_log_probabilities(self.encoded, self.background(order))
+        return self._background_log_probabilities[order]
+
+    def kmer_codes(self, width):
+        """
+        :param width: the length of the windows
+        :return: the k-mer code of every window of the data (see
+        kmers.kmer_codes)
+        """
+        if width not in self._kmer_codes:
+            self._kmer_codes[width] = kmer_codes(self.encoded, width)
+        return self._kmer_codes[width]
+
+    def eligible(self, motif_width, dust_threshold):
+        """
+        :param motif_width: the length for the motif
+        :param dust_threshold: the highest DUST score of an eligible window
+        :return: bool matrix with the start positions that are not masked as
+        low-complexity (see complexity.mask_low_complexity)
+        """
+        key = motif_width, dust_threshold
+        if key not in self._eligible:
+            self._eligible[key] = mask_low_complexity(
+                self.encoded, motif_width, dust_threshold)
+        return self._eligible[key]
+
+
+def load_dataset(file_name):
+    """
+    Reads a FASTA file and cleans it up the same way as analyse.process_data
+    :param file_name: The file name of the file which should contain the FASTA
+    data
+    :return: Dataset of the cleaned up strings
+    """
+    from analyse import get_fasta_data_list, clean_up_strings
+
+    return Dataset(clean_up_strings(get_fasta_data_list(file_name)))
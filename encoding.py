@@ -0,0 +1,74 @@
+# Conversion of DNA strings to compact integer arrays
+import numpy
+
+# Same order as exmin.to_index, so the codes can be used as rows of a belief
+# matrix directly
+ALPHABET = "ACGT"
+
+_LOOKUP = numpy.full(256, 255, dtype=numpy.uint8)
+for _code, _base in enumerate(ALPHABET):
+    _LOOKUP[ord(_base)] = _code
+
+
+def encode(string):
+    """
+    Encodes a single DNA string as an array of base codes (A=0, C=1, G=2, T=3)
+    :param string: DNA string, consist only of letters A, T, C or G
+    :return: uint8 numpy array with the code of every base
+
+    >>> encode("ACGTTA").tolist()
+    [0, 1, 2, 3, 3, 0]
+    """
+    raw = numpy.frombuffer(string.encode("ascii"), dtype=numpy.uint8)
+    codes = _LOOKUP[raw]
+    assert not (codes == 255).any(), "only A, C, G and T can be encoded"
+    return codes
+
+
+def encode_bytes(data):
+    """
+    Encodes raw DNA bytes (e.g. read from a file) without checking them, lower
+    case bases are accepted and any other letter gets code 255
+    >>> encode_bytes(b"acgN").tolist()
+    [0, 1, 2, 255]
+    """
+    return _LOOKUP[numpy.frombuffer(data.upper(), dtype=numpy.uint8)]
+
+
+def encode_sequences(sequences):
+    """
+    Encodes a set of DNA strings of the same length as a 2D array, one row per
+    string. Arrays that are already encoded are returned as they are.
+    :param sequences: the set of dna strings
+    :return: uint8 numpy array of shape (number of sequences, sequence length)
+
+    >>> encode_sequences(["ACG", "TTA"]).tolist()
+    [[0, 1, 2], [3, 3, 0]]
+    """
+    if isinstance(sequences, numpy.ndarray):
+        return sequences
+    assert not any(len(sequences[0]) != len(s) for s in sequences)
+
+    encoded = numpy.empty((len(sequences), len(sequences[0])), dtype=numpy.uint8)
+    for i, sequence in enumerate(sequences):
+        encoded[i] = encode(sequence)
+    return encoded
+
+
+def decode(codes):
+    """
+    Converts an array of base codes back to a DNA string
+    >>> decode(encode("GATTACA"))
+    'GATTACA'
+    """
+    return "".join(ALPHABET[code] for code in codes)
+
+
+def decode_sequences(encoded):
+    """
+    Converts a 2D array of base codes back to a list of DNA strings
+    >>> decode_sequences(encode_sequences(["ACG", "TTA"]))
+    ['ACG', 'TTA']
+    """
+    letters = numpy.frombuffer(ALPHABET.encode("ascii"), dtype=numpy.uint8)
+    return [row.tobytes().decode("ascii") for row in letters[encoded]]
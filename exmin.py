@@ -1,11 +1,39 @@
 # Implementation of the expectation min motif finding algorithm
+import math
 import random
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy
+
+from encoding import decode, encode, encode_sequences
+from kernels import score_windows, expected_counts
 from scoring import get_frequency_matrix
 
 EPS = 1
 BASES = 4
 
+# Hidden variables that only keep a few starting positions per sequence, both
+# fields have one row per sequence
+SparseHiddenVariables = namedtuple("SparseHiddenVariables",
+                                   ["positions", "weights"])
+
+# State of an EM run after one iteration: the hidden variables of the E-step,
+# the beliefs of the M-step, the log likelihood of the data under the beliefs
+# the E-step started from, the change in beliefs and the seconds since the start
+EMState = namedtuple("EMState", ["iteration", "hidden_variables", "beliefs",
+                                 "log_likelihood", "difference", "converged",
+                                 "elapsed"])
+
+# The most windows of which the E-step holds float64 scores at once, larger sets of sequences are done in blocks
+BLOCK_WINDOWS = 1 << 18
+
+# Thread pools used by the E- and M-step, one per amount of workers, they are
+# kept so the threads are reused by every iteration
+_executors = dict()
+
 
 def to_index(c):
     if c == 'A':
@@ -80,30 +108,256 @@ def prob_sequence_motif(sequence: str, motif_start: int, beliefs: list, motif_wi
 
     return probability
 
-def do_expectation(sequences: list, beliefs: list, motif_width: int):
+def sparsify_hidden_variables(hidden_variables, top_k=None, mass=None):
+    """
+    keeps only the most likely starting positions of every sequence, either the top_k positions or as many as are needed
+    to cover a mass of the probability (or both), the kept probabilities are normalized again
+    :param hidden_variables: dense matrix of hidden variables
+    :param top_k: maximum amount of positions kept per sequence
+    :param mass: probability mass that has to be covered per sequence
+    :return: SparseHiddenVariables with the kept positions and their probabilities, rows are padded with zero weights
+
+    >>> sparse = sparsify_hidden_variables(numpy.array([[0.1, 0.6, 0.3], [0.5, 0.25, 0.25]]), top_k=2)
+    >>> sparse.positions.tolist()
+    [[1, 2], [0, 1]]
+    >>> sparse.weights.tolist()
+    [[0.6666666865348816, 0.3333333432674408], [0.6666666865348816, 0.3333333432674408]]
+    >>> sparsify_hidden_variables(numpy.array([[0.1, 0.6, 0.3], [0.9, 0.05, 0.05]]), mass=0.8).weights.tolist()
+    [[0.6666666865348816, 0.3333333432674408], [1.0, 0.0]]
+    """
+    num_starts = hidden_variables.shape[1]
+    if top_k is not None and top_k < num_starts:
+        positions = numpy.argpartition(-hidden_variables, top_k - 1, axis=1)[:, :top_k]
+    else:
+        positions = numpy.tile(numpy.arange(num_starts), (len(hidden_variables), 1))
+    # order the kept positions from most to least likely
+    weights = numpy.take_along_axis(hidden_variables, positions, axis=1)
+    order = numpy.argsort(-weights, axis=1, kind="stable")
+    positions = numpy.take_along_axis(positions, order, axis=1)
+    weights = numpy.take_along_axis(weights, order, axis=1)
+
+    if mass is not None:
+        # a position is kept as long as the positions before it don't cover the mass yet
+        keep = numpy.cumsum(weights, axis=1) - weights < mass
+        width = keep.sum(axis=1).max()
+        positions, weights, keep = positions[:, :width], weights[:, :width], keep[:, :width]
+        weights = numpy.where(keep, weights, 0)
+
+    totals = weights.sum(axis=1, keepdims=True)
+    weights = numpy.divide(weights, totals, out=numpy.zeros_like(weights), where=totals > 0)
+    return SparseHiddenVariables(positions.astype(numpy.int32), weights.astype(numpy.float32))
+
+def get_executor(workers):
+    if workers not in _executors:
+        _executors[workers] = ThreadPoolExecutor(workers)
+    return _executors[workers]
+
+def split_blocks(num_sequences, workers):
+    """
+    divides the sequences in at most workers blocks of consecutive sequences
+    >>> split_blocks(5, 2)
+    [slice(0, 3, None), slice(3, 5, None)]
+    """
+    size = -(-num_sequences // workers)
+    return [slice(start, min(start + size, num_sequences)) for start in range(0, num_sequences, size)]
+
+def take_block(array, block):
+    """
+    the rows of a block of sequences of a per sequence array (or hidden variables), None stays None
+    """
+    if array is None:
+        return None
+    if isinstance(array, SparseHiddenVariables):
+        return SparseHiddenVariables(array.positions[block], array.weights[block])
+    return array[block]
+
+def join_blocks(results):
+    """
+    joins the hidden variables and log likelihoods of consecutive blocks of sequences, sparse rows are padded with
+    zero weights to the widest block
+    """
+    hidden_variables = [hidden_variables for hidden_variables, _ in results]
+    log_likelihood = sum(log_likelihood for _, log_likelihood in results)
+    if not isinstance(hidden_variables[0], SparseHiddenVariables):
+        return numpy.concatenate(hidden_variables), log_likelihood
+    width = max(block.positions.shape[1] for block in hidden_variables)
+    return SparseHiddenVariables(*(
+        numpy.concatenate([numpy.pad(field, ((0, 0), (0, width - field.shape[1]))) for field in fields])
+        for fields in zip(*hidden_variables))), log_likelihood
+
+def expectation_with_likelihood(sequences, beliefs, motif_width: int, background=None, eligible=None, workers=None,
+                                weights=None, top_k=None, mass=None):
+    """
+    the expectation step of the EM algorithm together with the log likelihood of the data under the beliefs
+    the probabilities are computed in log space, relative to the sequence being background only, so long sequences don't underflow
+    the float64 scores only exist for BLOCK_WINDOWS windows at a time, the hidden variables of a block are stored (and
+    sparsified) before the next block is scored
+    :param sequences: the set of dna strings (or the encoded set)
+    :param beliefs: the current beliefs
+    :param motif_width: the length for the motif
+    :param background: log background probability of every base (e.g. from Dataset.background_log_probabilities),
+    column 0 of the beliefs is used when not given
+    :param eligible: boolean matrix with the starting positions the motif may have, all positions when not given,
+    sequences without any eligible position get only zeros
+    :param workers: if given, the sequences are divided in blocks that are processed by this many threads
+    :param weights: the amount of times every sequence occurs in the data, the log likelihood is that of the data with
+    every sequence repeated as often
+    :param top_k: if given, keep only the top_k starting positions per sequence
+    :param mass: if given, keep only the starting positions needed to cover this probability mass per sequence
+    :return: the hidden variables, dense float32 or SparseHiddenVariables when top_k or mass is given, and the log
+    likelihood
+
+    >>> beliefs = [[0.25, 0.7, 0.1], [0.25, 0.1, 0.1], [0.25, 0.1, 0.1], [0.25, 0.1, 0.7]]
+    >>> round(float(expectation_with_likelihood(["AATC", "CCAT"], beliefs, 2)[1]), 3)
+    -8.978
+    """
+    encoded = encode_sequences(sequences)
+    num_starts = encoded.shape[1] - motif_width + 1
+    block_rows = max(1, BLOCK_WINDOWS // max(num_starts, 1))
+    if workers is not None and workers > 1 and len(encoded) > 1:
+        # every sequence has its own hidden variables and adds its own term to the log likelihood
+        blocks, mapper = split_blocks(len(encoded), workers), get_executor(workers).map
+    elif len(encoded) > block_rows:
+        blocks, mapper = split_blocks(len(encoded), -(-len(encoded) // block_rows)), map
+    else:
+        blocks = None
+    if blocks is not None:
+        return join_blocks(list(mapper(
+            lambda block: expectation_with_likelihood(encoded[block], beliefs, motif_width,
+                                                      take_block(background, block), take_block(eligible, block),
+                                                      weights=take_block(weights, block), top_k=top_k, mass=mass),
+            blocks)))
+
+    log_beliefs = numpy.log(numpy.asarray(beliefs, dtype=numpy.float64))
+    if background is None:
+        # the background of a window is the sum of column 0 over its bases, it is subtracted by scoring the window
+        # on the motif columns minus column 0, the background of a sequence follows from the count of every base
+        scores = score_windows(encoded, log_beliefs[:, 1:] - log_beliefs[:, :1])
+        base_counts = numpy.bincount((encoded + BASES * numpy.arange(len(encoded))[:, None]).ravel(),
+                                     minlength=BASES * len(encoded)).reshape(len(encoded), BASES)
+        row_log_likelihoods = base_counts @ log_beliefs[:, 0]
+    else:
+        cumulative = numpy.zeros((len(encoded), encoded.shape[1] + 1))
+        numpy.cumsum(background, axis=1, out=cumulative[:, 1:])
+        scores = score_windows(encoded, log_beliefs[:, 1:])
+        scores -= cumulative[:, motif_width:]
+        scores += cumulative[:, :num_starts]
+        row_log_likelihoods = cumulative[:, -1].copy()
+        del cumulative
+    if eligible is None:
+        num_eligible = numpy.full(len(encoded), num_starts)
+    else:
+        scores[~eligible] = -numpy.inf
+        num_eligible = eligible.sum(axis=1)
+    # sequences without eligible positions only consist of background
+    has_motif = num_eligible > 0
+
+    # normalize, we assume that it is equally likely that the motif will start in any eligible position
+    maximums = scores.max(axis=1, keepdims=True)
+    maximums[~has_motif] = 0
+    scores -= maximums
+    hidden_variables = numpy.exp(scores, out=scores)
+    row_totals = hidden_variables.sum(axis=1, keepdims=True)
+    row_totals[~has_motif] = 1
+    hidden_variables /= row_totals
+
+    row_log_likelihoods[has_motif] += (maximums + numpy.log(row_totals))[has_motif, 0] - numpy.log(
+        num_eligible[has_motif])
+    if weights is not None:
+        row_log_likelihoods *= weights
+    log_likelihood = float(row_log_likelihoods.sum())
+    hidden_variables = hidden_variables.astype(numpy.float32)
+    if top_k is not None or mass is not None:
+        return sparsify_hidden_variables(hidden_variables, top_k, mass), log_likelihood
+    return hidden_variables, log_likelihood
+
+def do_expectation(sequences, beliefs, motif_width: int, top_k=None, mass=None, background=None, eligible=None,
+                   workers=None):
     """
     the expectation step of the EM algorithm, we calculate the expected values of hidden variables based on the belief matrix
-    :param sequences: the set of dna strings
+    :param sequences: the set of dna strings (or the encoded set)
     :param beliefs: the current beliefs
     :param motif_width: the length for the motif
-    :return: the guessed hidden variables
-    """
-    new_hidden_variables = list()
-    for sequence in sequences:
-        new_row = list()
-        row_total = 0
-        for j in range(len(sequence) - motif_width + 1):
-            value = prob_sequence_motif(sequence, j, beliefs, motif_width)
-            new_row.append(value)
-            row_total += value
-        # normalize, we assume that it is equally likely that the motif will start in any position
-        if row_total != 0:
-            new_hidden_variables.append([value/row_total for value in new_row])
-        else:
-            new_hidden_variables.append(new_row)
-    return new_hidden_variables
-
-def count_occurences(sequences: list, hidden_variables, motif_width, c, k):
+    :param top_k: if given, keep only the top_k starting positions per sequence
+    :param mass: if given, keep only the starting positions needed to cover this probability mass per sequence
+    :param background: log background probability of every base (e.g. from Dataset.background_log_probabilities),
+    column 0 of the beliefs is used when not given
+    :param eligible: boolean matrix with the starting positions the motif may have, all positions when not given
+    :param workers: if given, the amount of threads the sequences are divided over
+    :return: the guessed hidden variables, a float32 matrix or SparseHiddenVariables when top_k or mass is given
+
+    >>> beliefs = [[0.25, 0.7, 0.1], [0.25, 0.1, 0.1], [0.25, 0.1, 0.1], [0.25, 0.1, 0.7]]
+    >>> do_expectation(["AATC", "CCAT"], beliefs, 2).astype(float).round(3).tolist()
+    [[0.123, 0.86, 0.018], [0.02, 0.02, 0.961]]
+    """
+    hidden_variables, _ = expectation_with_likelihood(sequences, beliefs, motif_width, background, eligible, workers,
+                                                      top_k=top_k, mass=mass)
+    return hidden_variables
+
+def most_likely_starts(hidden_variables):
+    """
+    the most likely starting position of the motif for every sequence
+    :param hidden_variables: dense or sparse hidden variables
+    :return: array with one starting position per sequence
+    """
+    if isinstance(hidden_variables, SparseHiddenVariables):
+        best = hidden_variables.weights.argmax(axis=1)
+        return hidden_variables.positions[numpy.arange(len(best)), best]
+    return numpy.asarray(hidden_variables).argmax(axis=1)
+
+def count_matrix(sequences, hidden_variables, motif_width, with_background=True, workers=None, weights=None):
+    """
+    calculates the expected # of every character at every position of the belief matrix, column 0 being the background
+    :param sequences: the set of dna strings (or the encoded set)
+    :param hidden_variables: dense or sparse hidden variables
+    :param motif_width: the length for the motif
+    :param with_background: whether column 0 has to be counted, it stays zero otherwise
+    :param workers: if given, the sequences are divided in blocks that are counted by this many threads
+    :param weights: the amount of times every sequence occurs in the data, once when not given
+    :return: array of shape (BASES, motif_width + 1) with the expected counts
+    """
+    encoded = encode_sequences(sequences)
+    if workers is not None and workers > 1 and len(encoded) > 1:
+        return sum(get_executor(workers).map(
+            lambda block: count_matrix(encoded[block], take_block(hidden_variables, block), motif_width,
+                                       with_background, weights=take_block(weights, block)),
+            split_blocks(len(encoded), workers)))
+    num_starts = encoded.shape[1] - motif_width + 1
+    counts = numpy.zeros((BASES, motif_width + 1))
+
+    # a start j only counts for position k while j + k - 1 <= len(sequence) - motif_width
+    if isinstance(hidden_variables, SparseHiddenVariables):
+        positions, start_weights = hidden_variables
+        if weights is not None:
+            start_weights = start_weights * weights[:, None]
+        rows = numpy.arange(len(encoded))[:, None]
+        for k in range(1, motif_width + 1):
+            valid = positions <= num_starts - k
+            characters = encoded[rows, positions + k - 1]
+            counts[:, k] = numpy.bincount(characters[valid], weights=start_weights[valid], minlength=BASES)
+    else:
+        hidden_variables = numpy.asarray(hidden_variables)
+        if weights is not None:
+            hidden_variables = hidden_variables * weights[:, None]
+        counts[:, 1:] = expected_counts(encoded, hidden_variables, motif_width)
+
+    # column 0 in the belief matrix represent the background
+    if with_background:
+        counts[:, 0] = get_composition(encoded, weights) - counts[:, 1:].sum(axis=1)
+    return counts
+
+def get_composition(sequences, weights=None):
+    """
+    the # of every character in all sequences
+    >>> get_composition(["AATC", "CCAT"], numpy.array([2, 1])).tolist()
+    [5.0, 4.0, 0.0, 3.0]
+    """
+    encoded = encode_sequences(sequences)
+    if weights is None:
+        return numpy.bincount(encoded.ravel(), minlength=BASES)
+    return numpy.bincount(encoded.ravel(), weights=numpy.repeat(weights, encoded.shape[1]), minlength=BASES)
+
+def count_occurences(sequences, hidden_variables, motif_width, c, k):
     """
     helper function to calculate # of c’s at position k in all sequences
     :param sequences: the set of dna strings
@@ -112,63 +366,55 @@ def count_occurences(sequences: list, hidden_variables, motif_width, c, k):
     :param c: the character we need to count
     :param k: the position in the sequence
     :return: # of c’s at position k in all sequences
+
+    >>> float(count_occurences(["AATC", "CCAT"], numpy.array([[0, 1, 0], [0, 0, 1]]), 2, 'A', 1))
+    2.0
     """
-    if k > 0:
-        total = 0
-        for i in range(len(sequences)):
-            # sum over positions where c appears
-            for j in range(len(sequences[i]) - k + 1):
-                if sequences[i][j + k - 1] == c and j + k - 1 <= len(sequences[i]) - motif_width:
-                    # add the probability
-                    total += hidden_variables[i][j]
-        return total
-    else:
-        # column 0 in the belief matrix represent the background
-        total_occurences = 0
-        # find total # c's in the entire data set
-        for sequence in sequences:
-            total_occurences += sequence.count(c)
-        others = 0
-        for j in range(1, motif_width+1):
-            others += count_occurences(sequences, hidden_variables, motif_width, c, j)
-        return total_occurences - others
-
-def do_maximization(sequences, hidden_variables, motif_width):
+    return count_matrix(sequences, hidden_variables, motif_width)[to_index(c)][k]
+
+def do_maximization(sequences, hidden_variables, motif_width, background_column=None, workers=None, weights=None):
     """
     maximization step of the EM algorithm, create new beliefs based on the hidden variables
-    :param sequences: the set of dna strings
-    :param hidden_variables: hidden variables
+    :param sequences: the set of dna strings (or the encoded set)
+    :param hidden_variables: dense or sparse hidden variables
     :param motif_width: the length for the motif
+    :param background_column: fixed base frequencies used as column 0 instead of recounting the background
+    :param workers: if given, the amount of threads the sequences are divided over
+    :param weights: the amount of times every sequence occurs in the data, once when not given
     :return: new beliefs
     """
-    new_beliefs = list()
-    for i in range(BASES):
-        new_row = list()
-        for k in range(motif_width + 1):
-            nominator = count_occurences(sequences, hidden_variables, motif_width, to_char(i), k) + 1 # plus one is a pseudocounter
-            denominator = 0
-            for b in range(BASES):
-                denominator += count_occurences(sequences, hidden_variables, motif_width, to_char(b), k) + 1
-            new_row.append(nominator/denominator)
-        new_beliefs.append(new_row)
+    counts = count_matrix(sequences, hidden_variables, motif_width, background_column is None, workers, weights)
+    return beliefs_from_counts(counts, background_column)
+
+def beliefs_from_counts(counts, background_column=None):
+    """
+    turns the expected counts of the M-step into beliefs
+    :param counts: expected counts (see count_matrix)
+    :param background_column: fixed base frequencies used as column 0
+    :return: new beliefs
+    """
+    counts = counts + 1 # plus one is a pseudocounter
+    new_beliefs = counts / counts.sum(axis=0)
+    if background_column is not None:
+        new_beliefs[:, 0] = background_column
     return new_beliefs
 
-def score_motif(sequences, starting_positions, motif):
+def score_motif(sequences, starting_positions, motif, weights=None):
     """
     simple scoring metric, looks at the starting positions with the highest chance and checks how many characters fit the motif given
     :param sequences: the set of dna strings
     :param starting_positions: matrix with probabilities for the starting position of the motif
     :param motif_width: the length for the motif
+    :param weights: the amount of times every sequence occurs in the data, once when not given
     :return: score calculated
     """
-    score = 0
-    for i in range(len(starting_positions)):
-        # the index of the motif is the highest probability for that sequence
-        motif_index = starting_positions[i].index(max(starting_positions[i]))
-        for j in range(len(motif)):
-            if sequences[i][motif_index + j] == motif[j]:
-                score += 1
-    return score
+    encoded = encode_sequences(sequences)
+    starts = most_likely_starts(starting_positions)
+    windows = encoded[numpy.arange(len(starts))[:, None], starts[:, None] + numpy.arange(len(motif))]
+    matches = (windows == encode(motif)).sum(axis=1)
+    if weights is not None:
+        matches = matches * weights
+    return int(matches.sum())
 
 def get_motif_from_beliefs(beliefs, motif_width):
     """
@@ -191,69 +437,240 @@ def get_motif_from_beliefs(beliefs, motif_width):
 def get_motifs_from_sequences(sequences, starting_positions, motif_width, verbose = False):
     """
     finds the motifs in the sequences based on the starting position matrix
+    :param sequences: the set of dna strings (or the encoded set)
     :param motif_width: the length for the motif
     :param starting_positions: matrix with probabilities for the starting position of the motif
-    :return: list with the found motif per sequence
+    :return: list with the found motif per sequence, as strings
     """
     motifs = list()
-    for i in range(len(starting_positions)):
-        motif_index = starting_positions[i].index(max(starting_positions[i]))
+    for i, motif_index in enumerate(most_likely_starts(starting_positions)):
         motif = sequences[i][motif_index:motif_index + motif_width]
+        if not isinstance(motif, str):
+            motif = decode(motif)
         motifs.append(motif)
         if verbose: print(motif)
     return motifs
 
 
-def exmin(sequences, motif_width, count=0):
+def iterate_exmin(sequences, motif_width, top_k=None, mass=None, background=None, eligible=None, workers=None,
+                  weights=None, beliefs=None):
+    """
+    runs the expectation minimization algorithm step by step, yielding the state after every iteration, it stops by itself
+    once the change in beliefs is smaller than EPS but the caller can stop at any time and keep the last state
+    :param sequences: the set of dna strings
+    :param motif_width: the length for the motif
+    :param top_k: keep only the top_k starting positions per sequence in the hidden variables
+    :param mass: keep only the starting positions covering this probability mass per sequence
+    :param background: log background probability of every base (e.g. from Dataset.background_log_probabilities),
+    the background is then fixed instead of being reestimated as column 0 every iteration
+    :param eligible: boolean matrix with the starting positions the motif may have, all positions when not given
+    :param workers: if given, the E- and M-step divide the sequences over this many threads
+    :param weights: the amount of times every sequence occurs in the data, once when not given
+    :param beliefs: the belief matrix to start from (e.g. found on part of the data), random when not given
+    :return: generator of EMState
+
+    >>> states = list(iterate_exmin(["ACGTAC", "TTACGT", "ACGTTT"], 4))
+    >>> states[-1].converged, all(not state.converged for state in states[:-1])
+    (True, True)
+
+    dividing the sequences over threads gives the same run
+    >>> sequences = ["ACGTACAA", "TTACGTTA", "ACGTTTGC", "GGACGTAT", "CACGTAAT"]
+    >>> for mass in (None, 0.9):
+    ...     random.seed(4)
+    ...     single = list(iterate_exmin(sequences, 4, mass=mass))
+    ...     random.seed(4)
+    ...     threaded = list(iterate_exmin(sequences, 4, mass=mass, workers=3))
+    ...     print(len(single) == len(threaded),
+    ...           all(numpy.allclose(a.beliefs, b.beliefs) for a, b in zip(single, threaded)),
+    ...           numpy.allclose([a.log_likelihood for a in single], [b.log_likelihood for b in threaded]))
+    True True True
+    True True True
+    """
+    time_start = time.perf_counter()
+    encoded = encode_sequences(sequences)
+    old_beliefs = initialize_beliefs(motif_width) if beliefs is None else beliefs
+    background_column = None
+    if background is not None:
+        composition = get_composition(encoded, weights)
+        background_column = composition / composition.sum()
+        old_beliefs = numpy.array(old_beliefs)
+        old_beliefs[:, 0] = background_column
+    iteration = 0
+    while True:
+        iteration += 1
+        hidden_variables, log_likelihood = expectation_with_likelihood(encoded, old_beliefs, motif_width, background,
+                                                                       eligible, workers, weights, top_k, mass)
+        new_beliefs = do_maximization(encoded, hidden_variables, motif_width, background_column, workers, weights)
+        difference = difference_in(old_beliefs, new_beliefs, motif_width)
+        converged = bool(difference <= EPS)
+        yield EMState(iteration, hidden_variables, new_beliefs, log_likelihood, difference, converged,
+                      time.perf_counter() - time_start)
+        if converged:
+            return
+        old_beliefs = new_beliefs
+
+def exmin(sequences, motif_width, count=0, top_k=None, mass=None, background=None, eligible=None, workers=None,
+          weights=None):
     """
     run the expectation minimization algorithm until the change in beliefs is smaller than EPS
     :param sequences: the set of dna strings
     :param motif_width: the length for the motif
+    :param top_k: keep only the top_k starting positions per sequence in the hidden variables
+    :param mass: keep only the starting positions covering this probability mass per sequence
+    :param background: log background probability of every base (e.g. from Dataset.background_log_probabilities),
+    the background is then fixed instead of being reestimated as column 0 every iteration
+    :param eligible: boolean matrix with the starting positions the motif may have, all positions when not given
+    :param workers: if given, the E- and M-step divide the sequences over this many threads
+    :param weights: the amount of times every sequence occurs in the data, once when not given
     :return: the probabilities of the hidden variables and the belief matrix
     """
-    old_beliefs = initialize_beliefs(motif_width)
-    while True:
+    for state in iterate_exmin(sequences, motif_width, top_k, mass, background, eligible, workers, weights):
         count += 1
-        hidden_variables = do_expectation(sequences, old_beliefs, motif_width)
-        new_beliefs = do_maximization(sequences, hidden_variables, motif_width)
-        if difference_in(old_beliefs, new_beliefs, motif_width) > EPS:
-            old_beliefs = new_beliefs
-        else:
-            return hidden_variables, new_beliefs, count
+    return state.hidden_variables, state.beliefs, count
 
-def find_motif_exmin(sequences, motif_width):
+def find_motif_exmin(sequences, motif_width, top_k=None, mass=None, background=None, eligible=None, workers=None,
+                     weights=None):
     """
     runs the EM algorithm one time
     :param sequences: the set of dna strings
     :param motif_width: the length for the motif
+    :param eligible: boolean matrix with the starting positions the motif may have, all positions when not given
+    :param workers: if given, the E- and M-step divide the sequences over this many threads
     :return: list of the motifs found by EM
     """
-    starting_positions, motif_beliefs, count = exmin(sequences, motif_width)
+    starting_positions, motif_beliefs, count = exmin(sequences, motif_width,
+                                                     top_k=top_k, mass=mass,
+                                                     background=background,
+                                                     eligible=eligible,
+                                                     workers=workers,
+                                                     weights=weights)
     return get_motifs_from_sequences(sequences, starting_positions,
                                      motif_width), count
 
-def best_of_exmin(sequences, motif_width, iterations=10):
+def best_exmin_run(sequences, motif_width, iterations=10, top_k=None, mass=None, background=None, eligible=None,
+                   count=0, confidence=None, min_iterations=3, weights=None):
     """
-    runs the EM algorithm multiple times and returns the best result, since EM is random
-    :param sequences: the set of dna strings
+    runs the EM algorithm multiple times and returns the run of which the most likely motif fits the data best
+    :param sequences: the set of dna strings (or the encoded set)
     :param motif_width: the length for the motif
-    :param iterations: amount of iterations to run
-    :return: best list of the motifs
+    :param iterations: amount of iterations to run, the maximum when confidence is given
+    :param confidence: when given, stop as soon as the best run has been found this many times (runs ending in the
+    same starting positions with the same score)
+    :param min_iterations: the least amount of iterations to run when confidence is given
+    :return: hidden variables and beliefs of the best run (both None if no run scored) and the total count
+
+    >>> random.seed(0)
+    >>> _, _, all_iterations = best_exmin_run(["ACGTACAA", "TTACGTTA", "ACGTTTGC"], 4, 20)
+    >>> random.seed(0)
+    >>> _, _, iterations = best_exmin_run(["ACGTACAA", "TTACGTTA", "ACGTTTGC"], 4, 20, confidence=3)
+    >>> iterations < all_iterations
+    True
     """
     max_score = 0
-    best_motifs = list()
-    count = 0
-    for _ in range(iterations):
-        starting_positions, motif_beliefs, count = exmin(sequences, motif_width,
-                                                         count)
-        found_motifs = get_motifs_from_sequences(sequences, starting_positions,
-                                                 motif_width)
+    best_run = None, None
+    best_starts = None
+    best_hits = 0
+    encoded = encode_sequences(sequences)
+    for iteration in range(iterations):
+        starting_positions, motif_beliefs, count = exmin(encoded, motif_width,
+                                                         count, top_k, mass,
+                                                         background, eligible,
+                                                         weights=weights)
         most_likely_motif = get_motif_from_beliefs(motif_beliefs, motif_width)
-        score = score_motif(sequences, starting_positions, most_likely_motif)
+        score = score_motif(encoded, starting_positions, most_likely_motif, weights)
+        starts = most_likely_starts(starting_positions)
         if score > max_score:
             max_score = score
-            best_motifs = found_motifs
-    return best_motifs, count
+            best_run = starting_positions, motif_beliefs
+            best_starts = starts
+            best_hits = 1
+        elif score == max_score and best_starts is not None and numpy.array_equal(starts, best_starts):
+            best_hits += 1
+        if confidence is not None and iteration + 1 >= min_iterations and best_hits >= confidence:
+            break
+    return best_run[0], best_run[1], count
+
+def race_exmin(sequences, motif_width, restarts=32, top_k=None, mass=None, background=None, eligible=None, count=0,
+               round_length=2, keep_fraction=0.5, finalists=1, weights=None):
+    """
+    successive halving over EM restarts: all restarts are advanced round_length iterations at a time, after every round
+    they are ranked by log likelihood and only the best keep_fraction of them continue, once finalists restarts are left
+    those run until convergence and the one of which the most likely motif fits the data best is returned
+    :param sequences: the set of dna strings (or the encoded set)
+    :param motif_width: the length for the motif
+    :param restarts: amount of restarts that start the race
+    :param round_length: amount of iterations per round
+    :param keep_fraction: fraction of the restarts that survives a round
+    :param finalists: amount of restarts that run until convergence
+    :return: hidden variables and beliefs of the best run (both None if no run scored) and the total count
+
+    >>> hidden, beliefs, count = race_exmin(["ACGTACAA", "TTACGTTA", "ACGTTTGC"], 4, restarts=8)
+    >>> hidden.shape, count >= 8
+    ((3, 5), True)
+    >>> race_exmin(["ACGTACAA", "TTACGTTA", "ACGTTTGC"], 4, keep_fraction=1)
+    Traceback (most recent call last):
+    ...
+    ValueError: keep_fraction must be between 0 and 1 (exclusive), not 1
+    """
+    # A round that keeps every restart (or none) never ends the race
+    if not 0 < keep_fraction < 1:
+        raise ValueError(f"keep_fraction must be between 0 and 1 (exclusive), not {keep_fraction}")
+    if finalists < 1:
+        raise ValueError(f"finalists must be at least 1, not {finalists}")
+    encoded = encode_sequences(sequences)
+    racers = [iterate_exmin(encoded, motif_width, top_k, mass, background, eligible, weights=weights)
+              for _ in range(restarts)]
+    states = [None] * restarts
+    alive = list(range(restarts))
+
+    def advance(i, iterations):
+        nonlocal count
+        for _ in range(iterations):
+            if states[i] is not None and states[i].converged:
+                return
+            states[i] = next(racers[i])
+            count += 1
+
+    while len(alive) > finalists:
+        for i in alive:
+            advance(i, round_length)
+        alive.sort(key=lambda i: states[i].log_likelihood, reverse=True)
+        for i in alive[max(finalists, math.ceil(len(alive) * keep_fraction)):]:
+            racers[i].close()
+        alive = alive[:max(finalists, math.ceil(len(alive) * keep_fraction))]
+
+    max_score = 0
+    best_run = None, None
+    for i in alive:
+        # run until convergence
+        advance(i, sys.maxsize)
+        most_likely_motif = get_motif_from_beliefs(states[i].beliefs, motif_width)
+        score = score_motif(encoded, states[i].hidden_variables, most_likely_motif, weights)
+        if score > max_score:
+            max_score = score
+            best_run = states[i].hidden_variables, states[i].beliefs
+    return best_run[0], best_run[1], count
+
+def best_of_exmin(sequences, motif_width, iterations=10, top_k=None, mass=None, background=None, eligible=None,
+                  confidence=None, min_iterations=3, racing=False, weights=None):
+    """
+    runs the EM algorithm multiple times and returns the best result, since EM is random
+    :param sequences: the set of dna strings
+    :param motif_width: the length for the motif
+    :param iterations: amount of iterations to run, the maximum when confidence is given (see best_exmin_run)
+    :param racing: prune weak restarts early with successive halving (see race_exmin), confidence is not used then
+    :return: best list of the motifs
+    """
+    if racing:
+        starting_positions, _, count = race_exmin(sequences, motif_width, iterations, top_k, mass, background,
+                                                  eligible, weights=weights)
+    else:
+        starting_positions, _, count = best_exmin_run(sequences, motif_width, iterations, top_k, mass, background,
+                                                      eligible, confidence=confidence,
+                                                      min_iterations=min_iterations, weights=weights)
+    if starting_positions is None:
+        return list(), count
+    return get_motifs_from_sequences(sequences, starting_positions, motif_width), count
 
 if __name__ == '__main__':
     from pprint import pprint
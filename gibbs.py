@@ -1,12 +1,29 @@
 # Implementation of the gibbs sampling algorithm
 import time
+from collections import namedtuple
 from copy import copy
-from random import randint
+from random import randint, choice, choices
 
-from scoring import get_scoring_matrix, score_pssm_log, get_frequency_matrix
+import numpy
+
+from encoding import decode, encode, encode_sequences
+from kernels import score_windows
+from kmers import kmer_codes, pays_off, score_table
+from scoring import get_scoring_matrix, get_frequency_matrix, \
+    log_matrix_to_array
 
 # Set the time out constant to 1
 TIME_OUT = 1
+# The amount of sweeps after which phase shifts are tried (they are also tried
+# when the positions stop changing)
+SHIFT_PERIOD = 5
+
+# State of the sampler after one sweep: the motif positions, the total log
+# score of the motifs at those positions relative to the background when
+# given (see get_positions_score, lower = better) and the seconds since the
+# start
+GibbsState = namedtuple("GibbsState", ["iteration", "positions", "score",
+                                       "converged", "elapsed"])
 
 
 def splice_string(string, start_position, length):
@@ -24,10 +41,13 @@ def get_motifs(motif_positions, instances, motif_length, exclude_position=None):
     """
     Get the motif substrings of all the instances given the motif positions
     Optional: Exclude a given position
+    The instances may also be encoded, the motifs are strings either way
     >>> get_motifs([0, 2, 1], ["ATCGG", "GGAAA", "TCTTT"], 2, 2)
     ['AT', 'AA']
     >>> get_motifs([0, 2, 1], ["ATCGG", "GGAAA", "TCTTT"], 2)
     ['AT', 'AA', 'CT']
+    >>> get_motifs([0, 2, 1], encode_sequences(["ATCGG", "GGAAA", "TCTTT"]), 2)
+    ['AT', 'AA', 'CT']
     """
     num_instances = len(instances)
     motifs = []
@@ -36,74 +56,317 @@ def get_motifs(motif_positions, instances, motif_length, exclude_position=None):
             dna_string = instances[i]
             start_position = motif_positions[i]
             motif = splice_string(dna_string, start_position, motif_length)
+            if not isinstance(motif, str):
+                motif = decode(motif)
             motifs.append(motif)
     return motifs
 
 
-def get_best_position(string, scoring_matrix, motif_length):
+def get_windows(encoded, motif_positions, motif_length):
+    """
+    The encoded motif at the position in every instance
+    >>> get_windows(encode_sequences(["ATCGG", "GGAAA"]), [0, 2], 2).tolist()
+    [[0, 3], [0, 0]]
+    """
+    positions = numpy.asarray(motif_positions, dtype=numpy.int64)
+    return encoded[numpy.arange(len(positions))[:, None],
+                   positions[:, None] + numpy.arange(motif_length)]
+
+
+def get_positions_score(motif_positions, encoded, motif_length, weights=None,
+                        background=None):
+    """
+    The total log score of the motifs at the positions on the scoring matrix
+    of those motifs, every site counts as often as its instance occurs. When
+    the background is given every site is scored relative to it, the same way
+    as get_best_position scores the windows. Lower = better.
+    >>> encoded = encode_sequences(["GTACC", "ATACC"])
+    >>> round(get_positions_score([1, 1], encoded, 2), 3)
+    1.427
+    >>> round(get_positions_score([1, 1], encoded, 2, background=numpy.full((2, 5), -1.0)), 3)
+    -2.573
+    """
+    windows = get_windows(encoded, motif_positions, motif_length)
+    log_array = log_matrix_to_array(get_scoring_matrix(windows, weights))
+    scores = log_array[windows, numpy.arange(motif_length)].sum(axis=1)
+    if background is not None:
+        scores += get_windows(background, motif_positions,
+                              motif_length).sum(axis=1)
+    if weights is not None:
+        scores *= weights
+    return float(scores.sum())
+
+
+def get_best_position(string, scoring_matrix, motif_length, background=None,
+                      eligible=None, codes=None, proportional=False,
+                      position=None):
     """
+    :param string: DNA string, or its encoded array
     :param scoring_matrix: Logged scorring matrix (e.g. obtained with get_scoring_matrix)
+    :param background: Log background probability of every base of the string,
+    when given windows are scored relative to the background
+    :param eligible: Bool per position whether the motif may start there
+    :param codes: The k-mer code of every window of the string (see
+    kmers.kmer_codes), the windows are then scored with a table of the scores
+    of all k-mers
+    :param proportional: Instead of the best position, choose a position at
+    random in proportion to the probability of its window
+    :param position: The current position of the motif in the string, where it
+    stays when no window may be chosen
     >>> get_best_position("TTTGT", {'A': [1, 1.3], 'T': [1.3, 0.05], 'C': [1.3, 1], 'G': [0.05, 1.3]}, 2)
     3
+    >>> get_best_position("TTTGT", {'A': [1, 1.3], 'T': [1.3, 0.05], 'C': [1.3, 1], 'G': [0.05, 1.3]}, 2, [0, -9, 0, 0, 0])
+    0
+    >>> get_best_position("TTTGT", {'A': [1, 1.3], 'T': [1.3, 0.05], 'C': [1.3, 1], 'G': [0.05, 1.3]}, 2, codes=numpy.array([15, 15, 14, 11]))
+    3
+    >>> get_best_position("TTTGT", {'A': [1, 1.3], 'T': [1.3, 0.05], 'C': [1.3, 1], 'G': [0.05, 1.3]}, 2, eligible=numpy.zeros(4, dtype=bool), proportional=True, position=2)
+    2
     """
-    best_position = 0
-    best_score = float('inf')  # lower = better
+    encoded = encode(string) if isinstance(string, str) else string
+    # The background and eligibility of every window, added to its score
+    offsets = numpy.zeros(len(encoded) - motif_length + 1)
+    if background is not None:
+        cumulative = numpy.concatenate(([0], numpy.cumsum(background)))
+        offsets += cumulative[motif_length:] - cumulative[:-motif_length]
+    if eligible is not None:
+        offsets[~eligible] = float('inf')
 
-    # Iterate over all posititions to find the best
-    for i in range(len(string) - motif_length + 1):
-        motif_guess = splice_string(string, i, motif_length)
-        score = score_pssm_log(motif_guess, scoring_matrix)
+    # Score all posititions at once, lower = better
+    if codes is not None:
+        scores = score_table(log_matrix_to_array(scoring_matrix))[codes]
+    else:
+        scores = score_windows(encoded[None, :],
+                               log_matrix_to_array(scoring_matrix))[0]
+    scores += offsets
 
-        # Check if score is better
-        if score < best_score:
-            best_score = score
-            best_position = i
+    if proportional:
+        if not numpy.isfinite(scores).any():
+            # No window may be chosen, the motif stays where it is
+            if position is not None:
+                return position
+            return randint(0, len(scores) - 1)
+        # The scores are minus the log probabilities
+        probabilities = numpy.exp(scores.min() - scores)
+        return choices(range(len(scores)), weights=probabilities)[0]
+    # The first of the best positions is taken
+    return int(numpy.argmin(scores))
 
+
+def get_new_position(index, motif_positions, encoded, motif_length,
+                     background=None, eligible=None, codes=None,
+                     weights=None, proportional=False):
+    """
+    :param encoded: The encoded instances
+    """
+    others = numpy.arange(len(encoded)) != index
+    # All copies of the instance are left out, the other instances count as
+    # often as they occur
+    motif_weights = None if weights is None else numpy.asarray(weights)[others]
+    scoring_matrix = get_scoring_matrix(
+        get_windows(encoded, motif_positions, motif_length)[others],
+        motif_weights)
+    dna_string = encoded[index]
+    string_background = None if background is None else background[index]
+    string_eligible = None if eligible is None else eligible[index]
+    string_codes = None if codes is None else codes[index]
+    best_position = get_best_position(dna_string, scoring_matrix, motif_length,
+                                      string_background, string_eligible,
+                                      string_codes, proportional,
+                                      motif_positions[index])
     return best_position
 
 
-def get_new_position(index, motif_positions, instances, motif_length):
-    motifs = get_motifs(motif_positions, instances, motif_length, index)
-    scoring_matrix = get_scoring_matrix(motifs)
-    dna_string = instances[index]
-    best_position = get_best_position(dna_string, scoring_matrix, motif_length)
-    return best_position
+def get_phase_shift(motif_positions, encoded, motif_length, max_shift,
+                    eligible=None, weights=None, background=None):
+    """
+    Finds the shift of all motif positions together by at most max_shift bases
+    to the left or right that gives the best total motif score, a sampler
+    often ends up with the motif aligned a few bases off
+    :param encoded: The encoded instances
+    :param background: Log background probability of every base of every
+    instance, the shifts are then scored relative to it (see
+    get_positions_score)
+    :return: The shift, 0 when no shift improves the score
+    >>> encoded = encode_sequences(["GTACC", "ATACC", "CTACC"])
+    >>> get_phase_shift([0, 0, 0], encoded, 2, 2)
+    1
+    >>> background = numpy.full((3, 5), -5.0)
+    >>> background[:, 1:3] = 0
+    >>> get_phase_shift([0, 0, 0], encoded, 2, 2, background=background)
+    2
+    """
+    best_shift = 0
+    best_score = get_positions_score(motif_positions, encoded, motif_length,
+                                     weights, background)
+    last_position = encoded.shape[1] - motif_length
+    for shift in range(-max_shift, max_shift + 1):
+        shifted = [position + shift for position in motif_positions]
+        if shift == 0 or min(shifted) < 0 or max(shifted) > last_position:
+            continue
+        if eligible is not None and not all(
+                eligible[i][position] for i, position in enumerate(shifted)):
+            continue
+        score = get_positions_score(shifted, encoded, motif_length, weights,
+                                    background)
+        if score < best_score:
+            best_shift = shift
+            best_score = score
+    return best_shift
 
 
-def gibbs_sample(instances, motif_length, count=0):
+def get_random_position(instance, motif_length, eligible=None):
     """
-    Finds a motif that's present in all instances
-    WARNING: Gibbs sampling is based on random start positions, so the result can change every time you run the code
-    :param instances: List of strings, each string has the same length, each string contains the motif
+    Random start position of the motif in the instance, only eligible positions
+    are chosen when there are any
+    >>> get_random_position("ACGTA", 2, numpy.array([False, False, True, False]))
+    2
+    """
+    if eligible is not None and eligible.any():
+        return int(choice(numpy.flatnonzero(eligible)))
+    return randint(0, len(instance) - motif_length)
+
+
+def iterate_gibbs(instances, motif_length, background=None, eligible=None,
+                  weights=None, phase_shift=0, sampling_sweeps=0,
+                  positions=None, codes=None):
+    """
+    Runs the gibbs sampler sweep by sweep, yielding the state after every sweep
+    over all instances. It stops by itself once the positions don't change
+    anymore, but the caller can stop at any time and keep the last state.
+    :param instances: List of strings, each string has the same length, each
+    string contains the motif (or the encoded strings, e.g. Dataset.encoded)
     :param motif_length: The length for the motif
-    :return: List of motif instances of the found motif
+    :param background: Log background probability of every base of every
+    instance (e.g. obtained with Dataset.background_log_probabilities)
+    :param eligible: Bool matrix with the positions the motif may start at in
+    every instance, all positions when not given
+    :param weights: The amount of times every instance occurs in the data,
+    once when not given. All copies of an instance share one position and are
+    left out together, which approximates the sampler on the expanded data
+    (process_data gives Gibbs all instances instead)
+    :param phase_shift: When given, every SHIFT_PERIOD sweeps and when the
+    positions stop changing, all positions are shifted by the best shift of
+    at most this many bases (see get_phase_shift)
+    :param sampling_sweeps: The amount of first sweeps that choose positions
+    in proportion to their probability instead of the best ones
+    :param positions: The motif position in every instance to start from,
+    random positions when not given
+    :param codes: The k-mer code of every window of every instance (e.g. from
+    Dataset.kmer_codes), the windows are then scored with a table of the
+    scores of all k-mers. When not given they are computed if the table pays
+    off.
+    :return: Generator of GibbsState
 
-    # Note: This test fails sometimes, because gibbs is random based
-    # >>> gibbs_sample(["CGTAC", "GTCCC", "AAGGT", "GCTGT"], 2)
-    # ['GT', 'GT', 'GT', 'GT']
+    >>> states = list(iterate_gibbs(["CGTAC", "GTCCC", "AAGGT", "GCTGT"], 2))
+    >>> states[-1].converged, all(not state.converged for state in states[:-1])
+    (True, True)
+
+    Strings and their encoded array give the same positions
+    >>> import random
+    >>> strings = ["CGTACGT", "GTCCCAA", "AAGGTCA", "GCTGTAC"]
+    >>> random.seed(2)
+    >>> list(iterate_gibbs(strings, 3))[-1].positions
+    [2, 1, 4, 4]
+    >>> random.seed(2)
+    >>> list(iterate_gibbs(encode_sequences(strings), 3))[-1].positions
+    [2, 1, 4, 4]
     """
+    encoded = encode_sequences(instances)
     # Random start positions in the dna string for each instance
-    motif_positions = [randint(0, len(instance) - motif_length) for instance in instances]
+    if positions is None:
+        motif_positions = [
+            get_random_position(instance, motif_length,
+                                None if eligible is None else eligible[i])
+            for i, instance in enumerate(encoded)]
+    else:
+        motif_positions = [int(position) for position in positions]
     # print(f"Start positions: {motif_positions}")  # for debugging
-
-    # Bool whether the position has been changed somewhere in the algorithm
-    positions_changed = True
+    # For short motifs every instance is scored with a table of the scores of
+    # all k-mers, the k-mers of the instances are only determined once
+    if codes is None and pays_off(encoded.shape[1] - motif_length + 1,
+                                  motif_length, cached=True):
+        codes = kmer_codes(encoded, motif_length)
 
     time_start = time.perf_counter()
-    while positions_changed:
-        count += 1
+    iteration = 0
+    while True:
+        iteration += 1
         old_positions = copy(motif_positions)
+        proportional = iteration <= sampling_sweeps
 
-        for i in range(len(instances)):
-            new_position = get_new_position(i, motif_positions, instances, motif_length)
+        for i in range(len(encoded)):
+            new_position = get_new_position(i, motif_positions, encoded,
+                                            motif_length, background, eligible,
+                                            codes, weights, proportional)
             motif_positions[i] = new_position
 
-        positions_changed = old_positions != motif_positions
-        time_elapsed = (time.perf_counter() - time_start)
+        # Whether the position has been changed somewhere in the sweep
+        positions_changed = old_positions != motif_positions or proportional
+        if phase_shift and (not positions_changed or
+                            iteration % SHIFT_PERIOD == 0):
+            shift = get_phase_shift(motif_positions, encoded, motif_length,
+                                    phase_shift, eligible, weights, background)
+            if shift:
+                motif_positions = [position + shift
+                                   for position in motif_positions]
+                positions_changed = True
+        score = get_positions_score(motif_positions, encoded, motif_length,
+                                    weights, background)
+        yield GibbsState(iteration, copy(motif_positions), score,
+                         not positions_changed,
+                         time.perf_counter() - time_start)
+        if not positions_changed:
+            return
+
+
+def sample_positions(instances, motif_length, count=0, background=None,
+                     eligible=None, weights=None, phase_shift=0,
+                     sampling_sweeps=0, codes=None):
+    """
+    Runs the gibbs sampler until the positions don't change anymore
+    :param codes: The k-mer codes of the windows (see iterate_gibbs)
+    :return: The motif positions in every instance and the updated count
+    """
+    for state in iterate_gibbs(instances, motif_length, background, eligible,
+                               weights, phase_shift, sampling_sweeps,
+                               codes=codes):
+        count += 1
         # If the loops run longer than timeout seconds, the function will throw an exception to time out
-        if time_elapsed > TIME_OUT:
+        if state.elapsed > TIME_OUT:
             raise Exception("\033[1;93mTimed out!\033[0m")
 
+    return state.positions, count
+
+
+def gibbs_sample(instances, motif_length, count=0, background=None,
+                 eligible=None, weights=None, phase_shift=0, sampling_sweeps=0,
+                 codes=None):
+    """
+    Finds a motif that's present in all instances
+    WARNING: Gibbs sampling is based on random start positions, so the result can change every time you run the code
+    :param instances: List of strings, each string has the same length, each string contains the motif
+    :param motif_length: The length for the motif
+    :param background: Log background probability of every base of every
+    instance (e.g. obtained with Dataset.background_log_probabilities)
+    :param eligible: Bool matrix with the positions the motif may start at in
+    every instance, all positions when not given
+    :param weights: The amount of times every instance occurs in the data,
+    once when not given (an approximation, see iterate_gibbs)
+    :param phase_shift: The largest shift of all positions that is tried (see
+    iterate_gibbs)
+    :param sampling_sweeps: The amount of sweeps that sample the positions in
+    proportion to their probability (see iterate_gibbs)
+    :param codes: The k-mer codes of the windows (see iterate_gibbs)
+    :return: List of motif instances of the found motif
+
+    # Note: This test fails sometimes, because gibbs is random based
+    # >>> gibbs_sample(["CGTAC", "GTCCC", "AAGGT", "GCTGT"], 2)
+    # ['GT', 'GT', 'GT', 'GT']
+    """
+    motif_positions, count = sample_positions(instances, motif_length, count,
+                                              background, eligible, weights,
+                                              phase_shift, sampling_sweeps,
+                                              codes)
     return get_motifs(motif_positions, instances, motif_length), count
 
 
@@ -111,23 +374,86 @@ def most_occuring(item_list):
     return max(item_list, key=item_list.count)
 
 
-def best_of_gibbs(instances, motif_length, num_iterations=10):
+def best_gibbs_positions(instances, motif_length, num_iterations=10,
+                         background=None, eligible=None, count=0,
+                         confidence=None, min_iterations=3, weights=None,
+                         phase_shift=0, sampling_sweeps=0, codes=None):
     """
-    Runs gibbs_sample multiple times and returns the most occuring solution
-    :param num_iterations: Times to run gibbs_sample
-    # Note: Test still possible to fail because gibbs is random based, but low chance
-    >>> best_of_gibbs(["CGTAC", "GTCCC", "AAGGT", "GCTGT"], 2)
-    ['GT', 'GT', 'GT', 'GT']
+    Runs the gibbs sampler multiple times and returns the positions of the most
+    occuring solution
+    :param num_iterations: Times to run the gibbs sampler, the maximum when
+    confidence is given
+    :param confidence: When given, stop as soon as the most occuring solution
+    occured this many times
+    :param min_iterations: The least amount of times to run the gibbs sampler
+    when confidence is given
+    :param codes: The k-mer codes of the windows (see iterate_gibbs), shared
+    by all runs
+    :return: The motif positions in every instance and the updated count
+
+    >>> import random
+    >>> random.seed(0)
+    >>> _, all_sweeps = best_gibbs_positions(["CGTAC", "GTCCC", "AAGGT", "GCTGT"], 2, 20)
+    >>> random.seed(0)
+    >>> _, sweeps = best_gibbs_positions(["CGTAC", "GTCCC", "AAGGT", "GCTGT"], 2, 20, confidence=3)
+    >>> sweeps < all_sweeps
+    True
     """
+    # The runs share the encoded instances and the k-mer codes
+    instances = encode_sequences(instances)
+    if codes is None and pays_off(instances.shape[1] - motif_length + 1,
+                                  motif_length, cached=True):
+        codes = kmer_codes(instances, motif_length)
     gibs_results = []
-    count = 0
-    for _ in range(num_iterations):
+    gibs_positions = []
+    occurrences = dict()
+    for restart in range(num_iterations):
         try:
-            gibbs_result, count = gibbs_sample(instances, motif_length, count)
-            gibs_results.append(gibbs_result)
+            motif_positions, count = sample_positions(instances, motif_length,
+                                                      count, background,
+                                                      eligible, weights,
+                                                      phase_shift,
+                                                      sampling_sweeps, codes)
+            gibs_results.append(
+                get_motifs(motif_positions, instances, motif_length))
+            gibs_positions.append(motif_positions)
         except Exception as e:
             print(e)
-    return most_occuring(gibs_results), count
+            continue
+
+        if confidence is None:
+            continue
+        key = tuple(gibs_results[-1])
+        occurrences[key] = occurrences.get(key, 0) + 1
+        if restart + 1 >= min_iterations and \
+                max(occurrences.values()) >= confidence:
+            break
+    best_result = most_occuring(gibs_results)
+    return gibs_positions[gibs_results.index(best_result)], count
+
+
+def best_of_gibbs(instances, motif_length, num_iterations=10, background=None,
+                  eligible=None, confidence=None, min_iterations=3,
+                  weights=None, phase_shift=0, sampling_sweeps=0, codes=None):
+    """
+    Runs gibbs_sample multiple times and returns the most occuring solution
+    :param num_iterations: Times to run gibbs_sample, the maximum when
+    confidence is given (see best_gibbs_positions)
+    :param codes: The k-mer codes of the windows (see iterate_gibbs)
+    # Note: Test still possible to fail because gibbs is random based, but low chance
+    >>> best_of_gibbs(["CGTAC", "GTCCC", "AAGGT", "GCTGT"], 2)
+    ['GT', 'GT', 'GT', 'GT']
+    """
+    motif_positions, count = best_gibbs_positions(instances, motif_length,
+                                                  num_iterations, background,
+                                                  eligible,
+                                                  confidence=confidence,
+                                                  min_iterations=min_iterations,
+                                                  weights=weights,
+                                                  phase_shift=phase_shift,
+                                                  sampling_sweeps=sampling_sweeps,
+                                                  codes=codes)
+    return get_motifs(motif_positions, instances, motif_length), count
 
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+# Inner loops of the scoring and EM code on encoded sequences
+#
+# Every kernel has a NumPy reference implementation. When numba is installed
+# a compiled version is used instead, the backend is chosen once at import
+# time and can be forced with the ICB_BEAM_BACKEND environment variable
+# ("python" or "numba").
+import os
+
+import numpy
+
+BASES = 4
+
+
+def _score_windows_reference(encoded, log_matrix):
+    num_windows = encoded.shape[1] - log_matrix.shape[1] + 1
+    scores = numpy.zeros((len(encoded), num_windows))
+    for k in range(log_matrix.shape[1]):
+        scores += log_matrix[encoded[:, k:k + num_windows], k]
+    return scores
+
+
+def _expected_counts_reference(encoded, hidden_variables, motif_width):
+    num_starts = hidden_variables.shape[1]
+    counts = numpy.zeros((BASES, motif_width))
+    for k in range(motif_width):
+        # a start j only counts for position k while j + k <= len - motif_width
+        size = num_starts - k
+        counts[:, k] = numpy.bincount(
+            encoded[:, k:k + size].ravel(),
+            weights=hidden_variables[:, :size].ravel(), minlength=BASES)
+    return counts
+
+
+def _best_matches_reference(encoded, motif, num_windows):
+    if num_windows <= 0:
+        return numpy.zeros(len(encoded), dtype=numpy.int64)
+    matches = numpy.zeros((len(encoded), num_windows), dtype=numpy.int64)
+    for k in range(len(motif)):
+        matches += encoded[:, k:k + num_windows] == motif[k]
+    return matches.max(axis=1)
+
+
+def _window_codes_reference(encoded, width):
+    # The codes of windows of width 1, 2, 4, ... are joined into the codes of
+    # wider windows, so it takes about 2 log2(width) passes instead of width
+    num_windows = encoded.shape[1] - width + 1
+    codes = numpy.zeros((len(encoded), num_windows), dtype=numpy.int64)
+    part = encoded.astype(numpy.int64)
+    part_width = 1
+    done = 0
+    while True:
+        if width & part_width:
+            codes *= BASES ** part_width
+            codes += part[:, done:done + num_windows]
+            done += part_width
+        if 2 * part_width > width:
+            return codes
+        part = part[:, :-part_width] * BASES ** part_width + \
+            part[:, part_width:]
+        part_width *= 2
+
+
+BACKEND = os.environ.get("ICB_BEAM_BACKEND", "numba")
+if BACKEND == "numba":
+    try:
+        import numba
+    except ImportError:
+        BACKEND = "python"
+
+if BACKEND == "numba":
+    # nogil so the kernels can run in parallel from a thread pool
+    @numba.njit(nogil=True, cache=True)
+    def _score_windows_numba(encoded, log_matrix):
+        motif_width = log_matrix.shape[1]
+        num_windows = encoded.shape[1] - motif_width + 1
+        scores = numpy.zeros((encoded.shape[0], num_windows))
+        for i in range(encoded.shape[0]):
+            for j in range(num_windows):
+                score = 0.0
+                for k in range(motif_width):
+                    score += log_matrix[encoded[i, j + k], k]
+                scores[i, j] = score
+        return scores
+
+    @numba.njit(nogil=True, cache=True)
+    def _expected_counts_numba(encoded, hidden_variables, motif_width):
+        num_starts = hidden_variables.shape[1]
+        counts = numpy.zeros((BASES, motif_width))
+        for i in range(encoded.shape[0]):
+            for k in range(motif_width):
+                for j in range(num_starts - k):
+                    counts[encoded[i, j + k], k] += hidden_variables[i, j]
+        return counts
+
+    @numba.njit(nogil=True, cache=True)
+    def _best_matches_numba(encoded, motif, num_windows):
+        best = numpy.zeros(encoded.shape[0], dtype=numpy.int64)
+        for i in range(encoded.shape[0]):
+            for j in range(num_windows):
+                matches = 0
+                for k in range(motif.shape[0]):
+                    if encoded[i, j + k] == motif[k]:
+                        matches += 1
+                if matches > best[i]:
+                    best[i] = matches
+        return best
+
+    @numba.njit(nogil=True, cache=True)
+    def _window_codes_numba(encoded, width):
+        num_windows = encoded.shape[1] - width + 1
+        codes = numpy.zeros((encoded.shape[0], num_windows),
+                            dtype=numpy.int64)
+        mask = (1 << 2 * width) - 1
+        for i in range(encoded.shape[0]):
+            # The code rolls over the sequence, one base in and one out
+            code = 0
+            for j in range(encoded.shape[1]):
+                code = (code * BASES + encoded[i, j]) & mask
+                if j >= width - 1:
+                    codes[i, j - width + 1] = code
+        return codes
+
+    _score_windows = _score_windows_numba
+    _expected_counts = _expected_counts_numba
+    _best_matches = _best_matches_numba
+    _window_codes = _window_codes_numba
+else:
+    _score_windows = _score_windows_reference
+    _expected_counts = _expected_counts_reference
+    _best_matches = _best_matches_reference
+    _window_codes = _window_codes_reference
+
+
+def score_windows(encoded, log_matrix):
+    """
+    Scores every window of every encoded sequence with a log matrix
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param log_matrix: array of shape (BASES, motif width), row per base code
+    :return: array of shape (number of sequences, number of windows)
+
+    >>> score_windows(numpy.array([[0, 3, 3]], dtype=numpy.uint8), numpy.array([[1.0, 2.0], [0, 0], [0, 0], [3.0, 4.0]])).tolist()
+    [[5.0, 7.0]]
+    """
+    return _score_windows(encoded, numpy.ascontiguousarray(log_matrix,
+                                                           dtype=numpy.float64))
+
+
+def expected_counts(encoded, hidden_variables, motif_width):
+    """
+    Expected # of every base at every motif position given the hidden variables
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param hidden_variables: dense matrix of hidden variables
+    :param motif_width: the length for the motif
+    :return: array of shape (BASES, motif_width)
+    """
+    return _expected_counts(encoded, numpy.ascontiguousarray(hidden_variables),
+                            motif_width)
+
+
+def best_matches(encoded, motif, num_windows):
+    """
+    Per sequence the largest # of bases that match the motif in one window
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param motif: uint8 array of base codes
+    :param num_windows: amount of windows (from the start) that are compared
+    :return: int array with one count per sequence
+
+    >>> best_matches(numpy.array([[0, 3, 3, 0]], dtype=numpy.uint8), numpy.array([3, 0], dtype=numpy.uint8), 3).tolist()
+    [2]
+    """
+    return _best_matches(encoded, motif, num_windows)
+
+
+def window_codes(encoded, width):
+    """
+    The base 4 number of the base codes of every window (see kmers)
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param width: the length of the windows, at least 1 and at most the
+    length of the sequences
+    :return: int64 array of shape (number of sequences, number of windows)
+
+    >>> window_codes(numpy.array([[0, 1, 2, 3]], dtype=numpy.uint8), 2).tolist()
+    [[1, 6, 11]]
+    """
+    return _window_codes(encoded, width)
+
+
+def check_parity(seed=0):
+    """
+    Compares the kernels of the active backend with the reference ones on
+    random data
+    :param seed: seed of the random data
+    :return: True when all kernels give the same results
+
+    >>> check_parity()
+    True
+    """
+    generator = numpy.random.default_rng(seed)
+    encoded = generator.integers(0, BASES, (7, 40)).astype(numpy.uint8)
+    log_matrix = -numpy.log(generator.dirichlet(numpy.ones(BASES), 6).T)
+    hidden_variables = generator.random((7, 35)).astype(numpy.float32)
+    motif = encoded[3, 5:11].copy()
+
+    return bool(
+        numpy.allclose(score_windows(encoded, log_matrix),
+                       _score_windows_reference(encoded, log_matrix))
+        and numpy.allclose(expected_counts(encoded, hidden_variables, 6),
+                           _expected_counts_reference(encoded,
+                                                      hidden_variables, 6))
+        and numpy.array_equal(best_matches(encoded, motif, 34),
+                              _best_matches_reference(encoded, motif, 34))
+        and all(numpy.array_equal(window_codes(encoded, width),
+                                  _window_codes_reference(encoded, width))
+                for width in (1, 3, 6, 7)))
@@ -0,0 +1,84 @@
+# Scoring windows by looking up their k-mer code in a table
+#
+# Every window of width W is identified by its code, the base 4 number of its
+# base codes. A logged scoring matrix of width W gives a score to each of the
+# 4^W possible codes, once that table is made scoring a window is one lookup.
+# Making the table costs about 4^W additions, so it only pays off for short
+# motifs when many windows are scored with the same matrix.
+import numpy
+
+from kernels import BACKEND, window_codes
+
+BASES = 4
+# The widest motif a table is made for, 4^12 scores take 128 MB
+MAX_WIDTH = 12
+# Rough costs in nanoseconds, measured on 1 Mb of sequence: per window and
+# per window base when scoring column by column, per window for making its
+# code and per table entry when making the table
+if BACKEND == "numba":
+    WINDOW_COST = 3.0
+    COLUMN_COST = 0.45
+    CODE_COST = 1.5
+else:
+    WINDOW_COST = 0.0
+    COLUMN_COST = 4.0
+    CODE_COST = 8.0
+TABLE_COST = 5.0
+# Per window for a lookup in a table that fits in the cache, which is up to
+# this width, every wider base about doubles the cost of a lookup
+LOOKUP_COST = 1.5
+CACHE_WIDTH = 9
+
+
+def kmer_codes(encoded, width):
+    """
+    The code of every window, rolled over the sequences in one pass (see
+    kernels.window_codes)
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param width: the length of the windows
+    :return: int64 array of shape (number of sequences, number of windows)
+
+    >>> kmer_codes(numpy.array([[0, 1, 2, 3]], dtype=numpy.uint8), 2).tolist()
+    [[1, 6, 11]]
+    """
+    if encoded.shape[1] < width:
+        return numpy.zeros((len(encoded), 0), dtype=numpy.int64)
+    return window_codes(encoded, width)
+
+
+def score_table(log_array):
+    """
+    The score of every possible window on a logged scoring matrix
+    :param log_array: Logged scoring matrix as array (see
+    scoring.log_matrix_to_array)
+    :return: array with the score of every code
+
+    >>> score_table(numpy.array([[1, 10], [2, 20], [3, 30], [4, 40]]))[[0, 6]].tolist()
+    [11, 32]
+    """
+    table = log_array[:, 0]
+    for k in range(1, log_array.shape[1]):
+        table = (table[:, None] + log_array[None, :, k]).ravel()
+    return table
+
+
+def pays_off(num_windows, width, cached=False):
+    """
+    Whether scoring the windows with a table is cheaper than scoring them
+    column by column, counting the making of the table and, unless they are
+    cached, of the codes of the windows
+    :param num_windows: the amount of windows scored with the same table
+    :param width: the width of the windows
+    :param cached: whether the codes of the windows are already made
+    >>> pays_off(1000, 4), pays_off(1000, 8), pays_off(10 ** 6, 8)
+    (True, False, True)
+    >>> pays_off(10 ** 6, 12)
+    False
+    """
+    if width > MAX_WIDTH:
+        return False
+    window_cost = LOOKUP_COST * 2 ** max(width - CACHE_WIDTH, 0)
+    if not cached:
+        window_cost += CODE_COST
+    return (num_windows * window_cost + BASES ** width * TABLE_COST
+            < num_windows * (WINDOW_COST + width * COLUMN_COST))
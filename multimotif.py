@@ -0,0 +1,113 @@
+# Finds several motifs in the same data by masking the sites of every motif
+# that has been found before searching for the next one
+from collections import namedtuple
+
+import numpy
+
+from exmin import best_exmin_run, most_likely_starts
+from gibbs import best_gibbs_positions, get_motifs
+from kmers import pays_off
+from scoring import BASES, get_total_motifs_score
+
+# A motif found in the data: its consensus, the instance in every sequence,
+# the start position of those instances and their log score per instance
+# (lower = better)
+FoundMotif = namedtuple("FoundMotif", ["consensus", "motifs", "sites",
+                                       "score"])
+
+
+def get_consensus(motifs):
+    """
+    The most occuring base on every position of the motifs
+    >>> get_consensus(["ACG", "ATG", "TTG"])
+    'ATG'
+    """
+    return "".join(max(BASES, key=column.count) for column in zip(*motifs))
+
+
+def mask_sites(eligible, sites, motif_width):
+    """
+    Makes every start position of which the motif would overlap a site
+    ineligible, the eligible matrix is changed in place
+    :param eligible: Bool matrix with the eligible start positions
+    :param sites: The start position of a site in every sequence (None for
+    sequences without a site)
+    :param motif_width: The length for the motif
+    >>> eligible = numpy.ones((1, 8), dtype=bool)
+    >>> mask_sites(eligible, [3], 2).astype(int).tolist()
+    [[1, 1, 0, 0, 0, 1, 1, 1]]
+    """
+    for i, site in enumerate(sites):
+        if site is None:
+            continue
+        eligible[i, max(0, site - motif_width + 1):site + motif_width] = False
+    return eligible
+
+
+def find_motifs(dataset, motif_width, num_motifs=3, algorithm="exmin",
+                iterations=10, background_order=None, dust=None):
+    """
+    Searches num_motifs motifs one after the other. After a motif is found the
+    start positions overlapping its sites are masked, so the next search finds
+    a different motif. The encoded data, the background model and the k-mer
+    codes of the dataset are reused by all searches.
+    :param dataset: Dataset with the sequences
+    :param motif_width: The length for the motifs
+    :param num_motifs: The amount of motifs to find
+    :param algorithm: "exmin" (best_of_exmin) or "gibbs" (best_of_gibbs)
+    :param iterations: The amount of restarts of every search
+    :param background_order: Markov order of the background model, when not
+    given the algorithms use their own background estimate
+    :param dust: When given, start positions in windows with a DUST score
+    above it are masked from the start as low-complexity
+    :return: List of FoundMotif, from the most sites to the least, motifs
+    with as many sites from best to worst score
+    """
+    num_starts = dataset.encoded.shape[1] - motif_width + 1
+    if dust is None:
+        eligible = numpy.ones((len(dataset), num_starts), dtype=bool)
+    else:
+        # A copy, the masking of the sites must not change the cached matrix
+        eligible = dataset.eligible(motif_width, dust).copy()
+    background = None
+    if background_order is not None:
+        background = dataset.background_log_probabilities(background_order)
+    codes = None
+    if algorithm == "gibbs" and pays_off(num_starts, motif_width, cached=True):
+        codes = dataset.kmer_codes(motif_width)
+
+    found_motifs = list()
+    for _ in range(num_motifs):
+        # Sequences of which every position is masked have no site anymore
+        has_site = eligible.any(axis=1)
+        if not has_site.any():
+            break
+
+        if algorithm == "exmin":
+            starting_positions, _, _ = best_exmin_run(
+                dataset.encoded, motif_width, iterations,
+                background=background, eligible=eligible)
+            if starting_positions is None:
+                break
+            sites = most_likely_starts(starting_positions)
+        elif algorithm == "gibbs":
+            sites, _ = best_gibbs_positions(dataset.encoded, motif_width,
+                                            iterations, background, eligible,
+                                            codes=codes)
+        else:
+            raise ValueError(f"Unknown algorithm {algorithm}")
+
+        sites = [int(site) if has_site[i] else None
+                 for i, site in enumerate(sites)]
+        kept = [i for i, site in enumerate(sites) if site is not None]
+        motifs = get_motifs([sites[i] for i in kept], dataset.encoded[kept],
+                            motif_width)
+        found_motifs.append(FoundMotif(
+            get_consensus(motifs), motifs, sites,
+            get_total_motifs_score(motifs) / len(motifs)))
+        mask_sites(eligible, sites, motif_width)
+
+    # A motif with fewer sites fits them more easily, so it only ranks
+    # higher when it has as many sites
+    return sorted(found_motifs, key=lambda found_motif: (
+        -len(found_motif.motifs), found_motif.score))
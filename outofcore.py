@@ -0,0 +1,143 @@
+# Exact EM on data that is too large to keep the hidden variables in memory
+#
+# The encoded sequences are kept in a .npy file that is memory-mapped. Every
+# iteration streams over the sequences in blocks, computes the hidden variables
+# of a block, adds the expected counts of the block and forgets the hidden
+# variables again. Summing the counts of the blocks gives the same counts as
+# the E- and M-step of exmin on all sequences at once, so the beliefs are the
+# same, but memory is bounded by the block size.
+import time
+
+import numpy
+
+from encoding import decode, encode_sequences
+from exmin import BASES, EPS, EMState, beliefs_from_counts, count_matrix, \
+    difference_in, expectation_with_likelihood, initialize_beliefs
+
+# The amount of sequences of a block
+BLOCK_SIZE = 1024
+
+
+def save_encoded(sequences, file_name):
+    """
+    Stores the encoded sequences so they can be memory-mapped by open_encoded
+    :param sequences: the set of dna strings (or the encoded set)
+    :param file_name: the .npy file to write
+    """
+    numpy.save(file_name, encode_sequences(sequences))
+
+
+def open_encoded(file_name):
+    """
+    Memory-maps encoded sequences stored by save_encoded, they are only read
+    from disk when they are used
+    """
+    return numpy.load(file_name, mmap_mode="r")
+
+
+def get_blocks(num_sequences, block_size):
+    return [slice(start, min(start + block_size, num_sequences))
+            for start in range(0, num_sequences, block_size)]
+
+
+def get_block(array, block):
+    # Copies the block to memory, so the block is read from disk once
+    return None if array is None else numpy.asarray(array[block])
+
+
+def iterate_exmin_out_of_core(encoded, motif_width, block_size=BLOCK_SIZE,
+                              background=None, eligible=None,
+                              keep_starts=True):
+    """
+    Runs the EM algorithm like exmin.iterate_exmin, one block of sequences at
+    a time
+    :param encoded: the encoded set of dna strings, e.g. opened by
+    open_encoded
+    :param motif_width: the length for the motif
+    :param block_size: the amount of sequences of which the hidden variables
+    are in memory at once
+    :param background: log background probability of every base, may be
+    memory-mapped as well (see exmin.iterate_exmin)
+    :param eligible: boolean matrix with the starting positions the motif may
+    have, may be memory-mapped as well
+    :param keep_starts: whether to keep the most likely starting position of
+    every sequence
+    :return: generator of EMState, of which the hidden variables are the most
+    likely starting positions (None when they are not kept)
+    """
+    time_start = time.perf_counter()
+    blocks = get_blocks(len(encoded), block_size)
+    old_beliefs = initialize_beliefs(motif_width)
+    background_column = None
+    if background is not None:
+        composition = sum(numpy.bincount(get_block(encoded, block).ravel(),
+                                         minlength=BASES) for block in blocks)
+        background_column = composition / encoded.size
+        old_beliefs = numpy.array(old_beliefs)
+        old_beliefs[:, 0] = background_column
+    iteration = 0
+    while True:
+        iteration += 1
+        counts = numpy.zeros((BASES, motif_width + 1))
+        log_likelihood = 0
+        starts = numpy.empty(len(encoded), dtype=numpy.int64) \
+            if keep_starts else None
+        for block in blocks:
+            block_encoded = get_block(encoded, block)
+            hidden_variables, block_log_likelihood = \
+                expectation_with_likelihood(block_encoded, old_beliefs,
+                                            motif_width,
+                                            get_block(background, block),
+                                            get_block(eligible, block))
+            counts += count_matrix(block_encoded, hidden_variables,
+                                   motif_width, background_column is None)
+            log_likelihood += block_log_likelihood
+            if keep_starts:
+                starts[block] = hidden_variables.argmax(axis=1)
+        new_beliefs = beliefs_from_counts(counts, background_column)
+        difference = difference_in(old_beliefs, new_beliefs, motif_width)
+        converged = bool(difference <= EPS)
+        yield EMState(iteration, starts, new_beliefs, log_likelihood,
+                      difference, converged, time.perf_counter() - time_start)
+        if converged:
+            return
+        old_beliefs = new_beliefs
+
+
+def exmin_out_of_core(encoded, motif_width, count=0, block_size=BLOCK_SIZE,
+                      background=None, eligible=None, keep_starts=True):
+    """
+    Runs the EM algorithm until convergence one block of sequences at a time,
+    with the same random state it gives the same beliefs as exmin.exmin
+    :return: the most likely starting positions (None when not kept), the
+    belief matrix and the count
+
+    >>> import random
+    >>> from exmin import exmin, most_likely_starts
+    >>> sequences = ["ACGTACAA", "TTACGTTA", "ACGTTTGC", "GGACGTAT"]
+    >>> random.seed(2)
+    >>> hidden_variables, beliefs, _ = exmin(sequences, 4)
+    >>> random.seed(2)
+    >>> starts, beliefs_out_of_core, _ = exmin_out_of_core(encode_sequences(sequences), 4, block_size=3)
+    >>> numpy.allclose(beliefs, beliefs_out_of_core), numpy.array_equal(most_likely_starts(hidden_variables), starts)
+    (True, True)
+    """
+    for state in iterate_exmin_out_of_core(encoded, motif_width, block_size,
+                                           background, eligible, keep_starts):
+        count += 1
+    return state.hidden_variables, state.beliefs, count
+
+
+def find_motif_out_of_core(file_name, motif_width, block_size=BLOCK_SIZE,
+                           background=None):
+    """
+    Runs the EM algorithm one time on encoded sequences stored by
+    save_encoded
+    :return: list of the motifs found by EM and the count
+    """
+    encoded = open_encoded(file_name)
+    starts, _, count = exmin_out_of_core(encoded, motif_width,
+                                         block_size=block_size,
+                                         background=background)
+    return [decode(encoded[i, start:start + motif_width])
+            for i, start in enumerate(starts)], count
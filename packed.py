@@ -0,0 +1,127 @@
+# 2-bit packed DNA windows
+#
+# With the codes of encoding.ALPHABET every base takes 2 bits, so a window of
+# up to 32 bases fits in one uint64. Two windows match in a base when the 2
+# bits of the base are the same in both, the mismatches are found at once by
+# XOR-ing the windows and counting the bases with a bit set.
+import numpy
+
+from encoding import encode, encode_sequences
+
+MAX_WIDTH = 32
+# The low bit of every base
+_LOW_BITS = numpy.uint64(0x5555555555555555)
+# The amount of windows times motifs compared at once by best_window_matches
+BLOCK_SIZE = 1 << 14
+# The amount of bits set in every byte
+_BYTE_COUNTS = numpy.array([bin(byte).count("1") for byte in range(256)],
+                           dtype=numpy.uint8)
+
+
+def popcount_bytes(x):
+    """
+    The amount of bits set in every uint64, looked up per byte
+    >>> popcount_bytes(numpy.array([0, 3, 2 ** 64 - 1], dtype=numpy.uint64)).tolist()
+    [0, 2, 64]
+    """
+    x = numpy.require(x, numpy.uint64, "C")
+    return _BYTE_COUNTS[x[..., None].view(numpy.uint8)].sum(axis=-1,
+                                                            dtype=numpy.uint8)
+
+
+# numpy.bitwise_count only exists since NumPy 2.0
+popcount = getattr(numpy, "bitwise_count", popcount_bytes)
+
+
+def get_mask(width):
+    return numpy.uint64((1 << 2 * width) - 1)
+
+
+def pack(codes):
+    """
+    Packs the base codes of one window, the first base in the highest bits
+    >>> pack(encode("ACGT"))
+    27
+    """
+    assert len(codes) <= MAX_WIDTH
+    packed = 0
+    for code in codes:
+        packed = packed << 2 | int(code)
+    return packed
+
+
+def pack_windows(encoded, width):
+    """
+    Packs every window of the given width of the encoded sequences, the window
+    is rolled over the sequences one base at a time
+    :param encoded: 2D uint8 array of base codes, one row per sequence
+    :param width: the length of the windows, at most MAX_WIDTH
+    :return: uint64 array of shape (number of sequences, number of windows)
+
+    >>> pack_windows(encode_sequences(["ACGTA"]), 4).tolist()
+    [[27, 108]]
+    """
+    assert 0 < width <= MAX_WIDTH
+    length = encoded.shape[1]
+    mask = get_mask(width)
+    windows = numpy.empty((len(encoded), max(length - width + 1, 0)),
+                          dtype=numpy.uint64)
+    window = numpy.zeros(len(encoded), dtype=numpy.uint64)
+    for j in range(length):
+        window = ((window << numpy.uint64(2)) |
+                  encoded[:, j].astype(numpy.uint64)) & mask
+        if j >= width - 1:
+            windows[:, j - width + 1] = window
+    return windows
+
+
+def count_mismatches(x, y):
+    """
+    The amount of bases in which packed windows differ
+    >>> count_mismatches(pack(encode("ACGT")), pack(encode("AGGA"))).tolist()
+    2
+    """
+    difference = numpy.bitwise_xor(numpy.uint64(x), numpy.uint64(y))
+    difference = (difference | difference >> numpy.uint64(1)) & _LOW_BITS
+    return popcount(difference)
+
+
+def count_matches(motifs, target):
+    """
+    The amount of bases every motif has in common with the start of the target
+    :param motifs: DNA strings of the same length, at most MAX_WIDTH
+    :param target: DNA string at least as long as the motifs
+    :return: int array with one count per motif
+
+    >>> count_matches(["TATA", "TTTT"], "TATAAA").tolist()
+    [4, 2]
+    """
+    width = len(motifs[0])
+    packed = pack_windows(encode_sequences(motifs), width)[:, 0]
+    return width - count_mismatches(packed, pack(encode(target[:width])))
+
+
+def best_window_matches(windows, motifs, width):
+    """
+    Per motif and sequence the largest amount of bases that match the motif in
+    one window
+    :param windows: packed windows (see pack_windows)
+    :param motifs: packed motifs of the same width as the windows
+    :param width: the length of the windows and motifs
+    :return: int array of shape (number of motifs, number of sequences)
+
+    >>> windows = pack_windows(encode_sequences(["ATTA"]), 2)
+    >>> best_window_matches(windows, [pack(encode("TA")), pack(encode("GG"))], 2).tolist()
+    [[2], [0]]
+    """
+    motifs = numpy.asarray(motifs, dtype=numpy.uint64)
+    best = numpy.zeros((len(motifs), len(windows)), dtype=numpy.int64)
+    # One sequence and a block of motifs at a time, so the intermediate arrays
+    # stay in the cache
+    block = max(1, BLOCK_SIZE // max(windows.shape[1], 1))
+    for i in range(len(windows) if windows.shape[1] else 0):
+        for start in range(0, len(motifs), block):
+            mismatches = count_mismatches(windows[i],
+                                          motifs[start:start + block, None])
+            best[start:start + block, i] = width - mismatches.min(axis=1)
+    return best
@@ -0,0 +1,141 @@
+# Exact score distribution of a logged scoring matrix under a background
+#
+# The scores of the matrix are rounded to multiples of a step, after which the
+# distribution of the score of a random window follows from dynamic
+# programming over the columns. Distributions are cached per matrix, so
+# converting between scores and p-values afterwards is a lookup.
+import hashlib
+from collections import OrderedDict, namedtuple
+
+import numpy
+
+from scoring import log_matrix_to_array
+
+BASES = 4
+# The amount of distributions kept in the cache
+CACHE_SIZE = 128
+
+# The probability of every score from minimum * step up to (minimum +
+# len(probabilities) - 1) * step, and the cumulative probability of scoring at
+# most that (lower = better, so that is the p-value)
+ScoreDistribution = namedtuple("ScoreDistribution",
+                               ["step", "minimum", "probabilities",
+                                "cumulative"])
+
+_distributions = OrderedDict()
+
+
+def get_fingerprint(integer_matrix, background, step):
+    """
+    Identifies a rounded matrix with the background and step it is used with
+    """
+    fingerprint = hashlib.sha1(integer_matrix.tobytes())
+    fingerprint.update(numpy.asarray(background, dtype=float).tobytes())
+    fingerprint.update(repr(step).encode())
+    return fingerprint.hexdigest()
+
+
+def compute_distribution(integer_matrix, background, step):
+    """
+    Calculates the distribution of the sum of one entry per column, where the
+    entry of base b is picked with probability background[b]
+    :param integer_matrix: Rounded scores, row per base code
+    :param background: Probability of every base code
+    :param step: The size of one unit of the rounded scores
+    :return: ScoreDistribution
+
+    >>> distribution = compute_distribution(numpy.array([[0, 0], [1, 1], [1, 1], [1, 1]]), [0.25] * 4, 1)
+    >>> distribution.minimum, distribution.probabilities.tolist()
+    (0, [0.0625, 0.375, 0.5625])
+    """
+    probabilities = numpy.ones(1)
+    for column in integer_matrix.T:
+        lowest = column.min()
+        new_probabilities = numpy.zeros(
+            len(probabilities) + column.max() - lowest)
+        for base in range(BASES):
+            shift = column[base] - lowest
+            new_probabilities[shift:shift + len(probabilities)] += \
+                probabilities * background[base]
+        probabilities = new_probabilities
+    minimum = int(integer_matrix.min(axis=0).sum())
+    return ScoreDistribution(step, minimum, probabilities,
+                             numpy.cumsum(probabilities))
+
+
+def get_score_distribution(log_matrix, background=None, step=0.01):
+    """
+    The distribution of the score of a random window on a logged scoring
+    matrix, computed once per matrix
+    :param log_matrix: Logged scoring matrix (e.g. obtained with
+    get_scoring_matrix) or its array form
+    :param background: Probability of every base in the order of
+    encoding.ALPHABET, uniform when not given
+    :param step: The resolution the scores are rounded to
+    :return: ScoreDistribution
+    """
+    if isinstance(log_matrix, dict):
+        log_matrix = log_matrix_to_array(log_matrix)
+    if background is None:
+        background = numpy.full(BASES, 1 / BASES)
+    integer_matrix = numpy.rint(log_matrix / step).astype(numpy.int64)
+
+    fingerprint = get_fingerprint(integer_matrix, background, step)
+    if fingerprint in _distributions:
+        _distributions.move_to_end(fingerprint)
+    else:
+        _distributions[fingerprint] = compute_distribution(integer_matrix,
+                                                           background, step)
+        if len(_distributions) > CACHE_SIZE:
+            _distributions.popitem(last=False)
+    return _distributions[fingerprint]
+
+
+def score_to_pvalue(log_matrix, score, background=None, step=0.01):
+    """
+    The probability that a random window scores at least as good (as low) as
+    the given score
+    >>> matrix = {'A': [0, 0], 'C': [1, 1], 'G': [1, 1], 'T': [1, 1]}
+    >>> score_to_pvalue(matrix, 0), score_to_pvalue(matrix, 1)
+    (0.0625, 0.4375)
+    >>> score_to_pvalue({'A': [0.006] * 3, 'C': [1] * 3, 'G': [1] * 3, 'T': [1] * 3}, 0.018)
+    0.015625
+
+    No window scores -inf and every window scores below inf, so the threshold
+    pvalue_to_threshold gives when no score is significant has p-value 0
+    >>> score_to_pvalue(matrix, pvalue_to_threshold(matrix, 0.01)), score_to_pvalue(matrix, float("inf"))
+    (0.0, 1.0)
+    """
+    if numpy.isinf(score):
+        return 0.0 if score < 0 else 1.0
+    distribution = get_score_distribution(log_matrix, background, step)
+    # Every column of the rounded matrix is up to half a step off, so a window
+    # can have a rounded score up to that many half steps above its score
+    columns = len(next(iter(log_matrix.values()))) \
+        if isinstance(log_matrix, dict) else log_matrix.shape[1]
+    index = int(numpy.floor(score / step + columns / 2 + 1e-9)) - \
+        distribution.minimum
+    if index < 0:
+        return 0.0
+    return float(distribution.cumulative[min(index,
+                                             len(distribution.cumulative) - 1)])
+
+
+def pvalue_to_threshold(log_matrix, pvalue, background=None, step=0.01):
+    """
+    The highest possible score of which the p-value is at most the given
+    p-value, windows scoring at or below it are significant at that level
+    :return: The threshold, -inf when even the best score is not significant
+    >>> matrix = {'A': [0, 0], 'C': [1, 1], 'G': [1, 1], 'T': [1, 1]}
+    >>> pvalue_to_threshold(matrix, 0.1), pvalue_to_threshold(matrix, 0.01)
+    (0.0, -inf)
+    """
+    distribution = get_score_distribution(log_matrix, background, step)
+    # Allow for the rounding errors of the cumulative sum
+    index = numpy.searchsorted(distribution.cumulative, pvalue * (1 + 1e-9),
+                               side="right") - 1
+    # Only scores that can occur are used as threshold
+    possible = numpy.flatnonzero(distribution.probabilities[:index + 1])
+    if not len(possible):
+        return float("-inf")
+    return (distribution.minimum + int(possible[-1])) * step
@@ -0,0 +1,173 @@
+# Scans FASTA files of any size for the windows that score well on a motif
+#
+# The file is read in overlapping chunks, so memory stays bounded by the chunk
+# size no matter how large the records are. The chunks are scored on both
+# strands in a thread pool with the kernels, which release the GIL.
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from complexity import dust_scores
+from encoding import encode_bytes
+from kernels import score_windows
+from kmers import kmer_codes, pays_off, score_table
+from pvalues import pvalue_to_threshold
+from scoring import log_matrix_to_array
+
+# A window scoring at or below the threshold: the record it is in (header
+# without '>'), its 0-based start on the forward strand, the strand ('+' or
+# '-') and its log score (lower = better)
+Hit = namedtuple("Hit", ["record", "position", "strand", "score"])
+
+
+def read_chunks(file_name, chunk_size, overlap):
+    """
+    Reads the records of a FASTA file in chunks of at most chunk_size bases,
+    every chunk starts with the last overlap bases of the chunk before it
+    (when in the same record)
+    :param file_name: The FASTA file, lines with a '>' or ':' are headers
+    :param chunk_size: The maximum amount of bases of a chunk
+    :param overlap: The amount of bases shared by consecutive chunks
+    :return: Generator of (record, offset of the chunk, bytes of the chunk)
+    """
+    with open(file_name, "rb") as f:
+        record = ""
+        buffer = bytearray()
+        offset = 0
+        for line in f:
+            line = line.strip()
+            if line.startswith(b">") or b":" in line:
+                if len(buffer) > overlap or (buffer and offset == 0):
+                    yield record, offset, bytes(buffer)
+                record = line.lstrip(b">").decode(errors="replace")
+                buffer = bytearray()
+                offset = 0
+                continue
+            buffer += line
+            while len(buffer) >= chunk_size:
+                yield record, offset, bytes(buffer[:chunk_size])
+                offset += chunk_size - overlap
+                del buffer[:chunk_size - overlap]
+        if len(buffer) > overlap or (buffer and offset == 0):
+            yield record, offset, bytes(buffer)
+
+
+def get_strand_matrices(log_array):
+    # The reverse complement of a window scores on the motif like the window
+    # scores on the matrix with the bases complemented and the positions
+    # reversed, with A, C, G, T codes complementing is reversing the rows
+    return (("+", log_array), ("-", log_array[::-1, ::-1]))
+
+
+def scan_chunk(chunk, log_array, threshold, tables=None, dust=None):
+    """
+    Scores every window of a chunk on both strands
+    :param chunk: Bytes of DNA, windows with other letters than A, C, G and T
+    (in any case) are skipped
+    :param log_array: Logged scoring matrix as array (see log_matrix_to_array)
+    :param threshold: The highest score that is reported
+    :param tables: The score of every k-mer on the forward and reverse strand
+    (see kmers.score_table), the windows are then scored by looking up their
+    k-mer code
+    :param dust: When given, windows with a DUST score above it are skipped
+    as low-complexity (see complexity.dust_scores)
+    :return: List of (position in the chunk, strand, score) of the hits
+
+    >>> log_array = log_matrix_to_array({'A': [0, 5], 'T': [5, 0], 'C': [5, 5], 'G': [5, 5]})
+    >>> scan_chunk(b"GATNAT", log_array, 1)
+    [(1, '+', 0.0), (4, '+', 0.0), (1, '-', 0.0), (4, '-', 0.0)]
+    >>> scan_chunk(b"GATNAT", log_array, 1, get_score_tables(log_array))
+    [(1, '+', 0.0), (4, '+', 0.0), (1, '-', 0.0), (4, '-', 0.0)]
+    >>> log_array = log_matrix_to_array({'A': [0] * 5, 'T': [5] * 5, 'C': [5] * 5, 'G': [5] * 5})
+    >>> scan_chunk(b"AAAAAAT", log_array, 6), scan_chunk(b"AAAAAAT", log_array, 6, dust=1.0)
+    ([(0, '+', 0.0), (1, '+', 0.0), (2, '+', 5.0)], [(2, '+', 5.0)])
+    """
+    motif_length = log_array.shape[1]
+    codes = encode_bytes(chunk)
+    if len(codes) < motif_length:
+        return list()
+    invalid = codes == 255
+    codes = numpy.where(invalid, 0, codes)[None, :]
+    cumulative = numpy.concatenate(([0], numpy.cumsum(invalid)))
+    valid = (cumulative[motif_length:] - cumulative[:-motif_length]) == 0
+    if dust is not None:
+        valid &= dust_scores(codes, motif_length)[0] <= dust
+
+    if tables is not None:
+        window_codes = kmer_codes(codes, motif_length)[0]
+
+    hits = list()
+    for index, (strand, matrix) in enumerate(get_strand_matrices(log_array)):
+        if tables is not None:
+            scores = tables[index][window_codes]
+        else:
+            scores = score_windows(codes, matrix)[0]
+        positions = numpy.flatnonzero(valid & (scores <= threshold))
+        hits.extend((int(position), strand, float(scores[position]))
+                    for position in positions)
+    return hits
+
+
+def get_score_tables(log_array):
+    """
+    The score of every k-mer on the forward and reverse strand
+    """
+    return [score_table(matrix) for _, matrix in get_strand_matrices(log_array)]
+
+
+def scan_fasta(file_name, log_matrix, threshold=None, chunk_size=1 << 20,
+               workers=None, pvalue=None, background=None, dust=None):
+    """
+    Finds all windows in a FASTA file of which the forward or reverse strand
+    scores at or below the threshold on the motif
+    :param file_name: The FASTA file to scan
+    :param log_matrix: Logged scoring matrix (e.g. obtained with
+    get_scoring_matrix)
+    :param threshold: The highest score that is reported
+    :param chunk_size: The amount of bases scored at once
+    :param workers: The amount of threads, one per core by default
+    :param pvalue: Instead of a threshold, the p-value a window must have at
+    most under the background (see pvalues.pvalue_to_threshold)
+    :param background: Probability of every base in the order of
+    encoding.ALPHABET for the p-value, uniform when not given
+    :param dust: When given, windows with a DUST score above it are skipped
+    as low-complexity
+    :return: Generator of Hit, in the order of the file
+
+    >>> next(scan_fasta("motifs.fasta", {'A': [0], 'C': [1], 'G': [1], 'T': [1]}))
+    Traceback (most recent call last):
+    ...
+    ValueError: Give either a threshold or a p-value
+    """
+    if (threshold is None) == (pvalue is None):
+        raise ValueError("Give either a threshold or a p-value")
+    log_array = log_matrix_to_array(log_matrix)
+    if threshold is None:
+        threshold = pvalue_to_threshold(log_array, pvalue, background)
+    overlap = log_array.shape[1] - 1
+    assert chunk_size > overlap
+    workers = workers or os.cpu_count() or 1
+    # For short motifs the tables are made once and used for all chunks
+    tables = None
+    if pays_off(chunk_size - overlap, log_array.shape[1]):
+        tables = get_score_tables(log_array)
+
+    with ThreadPoolExecutor(workers) as executor:
+        # Only a few chunks per thread are read ahead to bound the memory
+        max_pending = 2 * workers
+        pending = deque()
+        for record, offset, chunk in read_chunks(file_name, chunk_size,
+                                                 overlap):
+            pending.append((record, offset, executor.submit(
+                scan_chunk, chunk, log_array, threshold, tables, dust)))
+            if len(pending) >= max_pending:
+                yield from _get_hits(*pending.popleft())
+        while pending:
+            yield from _get_hits(*pending.popleft())
+
+
+def _get_hits(record, offset, future):
+    for position, strand, score in future.result():
+        yield Hit(record, offset + position, strand, score)
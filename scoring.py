@@ -3,29 +3,51 @@ from math import log
 
 import numpy
 
+from encoding import ALPHABET, encode
+from kernels import score_windows
+
 BASES = ["A", "T", "C", "G"]
 
 
-def instances_to_count_matrix(instances):
+def instances_to_count_matrix(instances, weights=None):
     """
     Convert known instances to count matrix (slide 17)
     :param instances: Vector of strings of the same length (containing only the
-    letters A, T, C and G)
+    letters A, T, C and G), or their encoded 2D array
+    :param weights: The amount of times every instance counts, once when not
+    given
     :return: A dict with 4 entries (A, T, C and G), with each entry containing a
     list of the occurances of that letter on given position
 
 
     >>> instances_to_count_matrix(["ACC", "ATG"])
     {'A': [2, 0, 0], 'T': [0, 1, 0], 'C': [0, 1, 1], 'G': [0, 0, 1]}
+    >>> instances_to_count_matrix(["ACC", "ATG"], [3, 1])
+    {'A': [4, 0, 0], 'T': [0, 1, 0], 'C': [0, 3, 3], 'G': [0, 0, 1]}
+    >>> instances_to_count_matrix(numpy.array([[0, 1, 1], [0, 3, 2]]))
+    {'A': [2, 0, 0], 'T': [0, 1, 0], 'C': [0, 1, 1], 'G': [0, 0, 1]}
     """
+    if isinstance(instances, numpy.ndarray):
+        # Encoded instances, a row of base codes per instance
+        motif_length = instances.shape[1]
+        codes = instances + len(ALPHABET) * numpy.arange(motif_length)
+        counts = numpy.bincount(
+            codes.ravel(), None if weights is None else numpy.repeat(
+                weights, motif_length),
+            minlength=len(ALPHABET) * motif_length).reshape(motif_length,
+                                                            len(ALPHABET))
+        return {base: counts[:, ALPHABET.index(base)].tolist()
+                for base in BASES}
     assert not any(len(instances[0]) != len(i) for i in instances)
 
     motif_length = len(instances[0])
     count_matrix = {base: [0] * motif_length for base in BASES}
-    for instance in instances:
+    if weights is None:
+        weights = [1] * len(instances)
+    for instance, weight in zip(instances, weights):
         for i in range(len(instance)):
             base = instance[i]
-            count_matrix[base][i] += 1
+            count_matrix[base][i] += weight
     return count_matrix
 
 
@@ -101,23 +123,57 @@ def score_pssm_log(string, log_matrix):
     return score
 
 
+def log_matrix_to_array(log_matrix):
+    """
+    Converts a (log) scoring matrix dict to an array with a row per base code
+    (in the order of encoding.ALPHABET), as used by the kernels
+    >>> log_matrix_to_array({'A': [1, 2], 'T': [3, 4], 'C': [5, 6], 'G': [7, 8]}).tolist()
+    [[1.0, 2.0], [5.0, 6.0], [7.0, 8.0], [3.0, 4.0]]
+    """
+    return numpy.array([log_matrix[base] for base in ALPHABET], dtype=float)
+
+
+def score_windows_log(string, log_matrix):
+    """
+    Scores every window of a DNA string with a logged scoring matrix, the
+    window starting at i gets score_pssm_log(string[i:i + motif length])
+    Lower score is better
+    >>> score_windows_log("TTA", {'A': [1, 2], 'T': [3, 4], 'C': [5, 6], 'G': [7, 8]}).tolist()
+    [7.0, 5.0]
+    """
+    return score_windows(encode(string)[None, :],
+                         log_matrix_to_array(log_matrix))[0]
+
+
 def add_pseudo_counts(frequency_matrix, low_frequency=0.1):
     """
-    Replaces all zeros with a low frequency. Sum per position stays 1.
+    Replaces all zeros with a low frequency. Sum per position stays 1. The
+    low frequencies are taken from the observed bases equally, but no
+    observed base drops below the low frequency, so a base that occurred
+    never scores worse than one that didn't.
     >>> add_pseudo_counts({'A': [1.0, 0.0], 'T': [0.0, 0.5], 'C': [0.0, 0.5], 'G': [0.0, 0.0]})
     {'A': [0.7, 0.1], 'T': [0.1, 0.4], 'C': [0.1, 0.4], 'G': [0.1, 0.1]}
+    >>> add_pseudo_counts({'A': [0.9], 'T': [0.1], 'C': [0.0], 'G': [0.0]})
+    {'A': [0.7], 'T': [0.1], 'C': [0.1], 'G': [0.1]}
     """
     motif_length = len(frequency_matrix[BASES[0]])
     pseudo_matrix = {base: [0] * motif_length for base in BASES}
     for i in range(motif_length):
-        position_frequencies = [frequency_matrix[base][i] for base in BASES]
-        zero_count = sum(map(lambda i: i == 0, position_frequencies))
-        nonzero_count = len(BASES) - zero_count
-        diff = (zero_count * low_frequency) / nonzero_count
+        # The observed bases that give up frequency, those that would drop
+        # below the low frequency are set to it instead
+        lowered = [base for base in BASES if frequency_matrix[base][i] != 0]
+        while True:
+            available = 1 - low_frequency * (len(BASES) - len(lowered))
+            diff = (sum(frequency_matrix[base][i] for base in lowered) -
+                    available) / len(lowered)
+            too_low = [base for base in lowered
+                       if frequency_matrix[base][i] - diff < low_frequency]
+            if not too_low:
+                break
+            lowered = [base for base in lowered if base not in too_low]
         for base in BASES:
-            base_frequency = frequency_matrix[base][i]
-            pseudo_matrix[base][
-                i] = low_frequency if base_frequency == 0 else base_frequency - diff
+            pseudo_matrix[base][i] = frequency_matrix[base][i] - diff \
+                if base in lowered else low_frequency
     return pseudo_matrix
 
 
@@ -132,21 +188,28 @@ def freq_to_log_matrix(frequency_matrix):
     return log_matrix
 
 
-def get_scoring_matrix(instances):
-    frequency_matrix = get_frequency_matrix(instances)
+def get_scoring_matrix(instances, weights=None):
+    """
+    The logged scoring matrix of the instances, with pseudocounts
+    (see add_pseudo_counts)
+    >>> matrix = get_scoring_matrix(["A"] * 9 + ["T"])
+    >>> [round(matrix[base][0], 3) for base in BASES]
+    [0.357, 2.303, 2.303, 2.303]
+    """
+    frequency_matrix = get_frequency_matrix(instances, weights)
     pseudo_matrix = add_pseudo_counts(frequency_matrix)
     log_matrix = freq_to_log_matrix(pseudo_matrix)
     return log_matrix
 
 
-def get_frequency_matrix(instances):
-    count_matrix = instances_to_count_matrix(instances)
+def get_frequency_matrix(instances, weights=None):
+    count_matrix = instances_to_count_matrix(instances, weights)
     frequency_matrix = count_to_frequency_matrix(count_matrix)
     return frequency_matrix
 
 
-def get_motifs_score(motifs):
-    scoring_matrix = get_scoring_matrix(motifs)
+def get_motifs_score(motifs, weights=None):
+    scoring_matrix = get_scoring_matrix(motifs, weights)
     score_dict = dict()
     for motif in motifs:
         score_dict[motif] = score_pssm_log(motif, scoring_matrix)
@@ -165,11 +228,11 @@ def get_motifs_percentage(motifs):
 
 def get_total_motifs_percentage(motifs):
     score_dict = get_motifs_percentage(motifs)
-    return numpy.product(list(score_dict.values()))
+    return numpy.prod(list(score_dict.values()))
 
 
-def get_total_motifs_score(motifs):
-    score_dict = get_motifs_score(motifs)
+def get_total_motifs_score(motifs, weights=None):
+    score_dict = get_motifs_score(motifs, weights)
     return sum(list(score_dict.values()))
 
 
@@ -0,0 +1,110 @@
+# Shares a Dataset with worker processes without copying it
+#
+# The parent places the encoded sequences, the background tables and the k-mer
+# codes in shared memory segments, only their names, shapes and dtypes are pickled to the
+# workers, which attach to the segments by name. The parent owns the segments
+# and unlinks them when it is done with them, also when a worker crashed.
+from collections import namedtuple
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy
+
+from dataset import Dataset
+
+# What a worker needs to attach to an array in shared memory
+SharedArray = namedtuple("SharedArray", ["name", "shape", "dtype"])
+
+# The encoded sequences, the background_log_probabilities per order and the
+# kmer_codes per width of a Dataset, as SharedArray
+SharedDataset = namedtuple("SharedDataset",
+                           ["encoded", "background_log_probabilities",
+                            "kmer_codes"])
+
+# The segments attached to by this process, they have to stay open as long as
+# the arrays on them are used
+_attached = dict()
+
+
+def create_shared_array(array):
+    """
+    Copies an array to a new shared memory segment
+    :param array: numpy array
+    :return: the segment (to close and unlink it afterwards) and its
+    SharedArray
+    """
+    segment = shared_memory.SharedMemory(create=True,
+                                         size=max(array.nbytes, 1))
+    shared = numpy.ndarray(array.shape, array.dtype, buffer=segment.buf)
+    shared[...] = array
+    return segment, SharedArray(segment.name, array.shape, array.dtype.str)
+
+
+def attach_array(shared_array):
+    """
+    Gives the array in a shared memory segment without copying it, the segment
+    stays attached until the process ends
+    :param shared_array: SharedArray
+    :return: read only numpy array
+    """
+    if shared_array.name not in _attached:
+        _attached[shared_array.name] = shared_memory.SharedMemory(
+            shared_array.name)
+    array = numpy.ndarray(shared_array.shape, shared_array.dtype,
+                          buffer=_attached[shared_array.name].buf)
+    array.flags.writeable = False
+    return array
+
+
+@contextmanager
+def share_dataset(dataset, background_orders=(), kmer_widths=()):
+    """
+    Places a Dataset in shared memory for as long as the with block runs
+    :param dataset: Dataset
+    :param background_orders: The orders of which the background tables are
+    computed and shared as well
+    :param kmer_widths: The widths of which the k-mer codes are computed and
+    shared as well
+    :return: SharedDataset to pass to the workers (see attach_dataset)
+
+    >>> with share_dataset(Dataset(["ACGT", "AACC"]), [0], [2]) as shared:
+    ...     attached = attach_dataset(shared)
+    ...     attached.sequences, attached.background_log_probabilities(0).shape
+    ...     attached.kmer_codes(2).tolist()
+    (['ACGT', 'AACC'], (2, 4))
+    [[1, 6, 11], [0, 1, 5]]
+    """
+    segments = list()
+    try:
+        segment, encoded = create_shared_array(dataset.encoded)
+        segments.append(segment)
+        backgrounds = dict()
+        for order in background_orders:
+            segment, backgrounds[order] = create_shared_array(
+                dataset.background_log_probabilities(order))
+            segments.append(segment)
+        codes = dict()
+        for width in kmer_widths:
+            segment, codes[width] = create_shared_array(
+                dataset.kmer_codes(width))
+            segments.append(segment)
+        yield SharedDataset(encoded, backgrounds, codes)
+    finally:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+
+def attach_dataset(shared_dataset):
+    """
+    Gives the Dataset placed in shared memory by share_dataset, its arrays are
+    read where they are, without copying them
+    :param shared_dataset: SharedDataset
+    :return: Dataset
+    """
+    return Dataset.from_encoded(
+        attach_array(shared_dataset.encoded),
+        {order: attach_array(shared_array) for order, shared_array in
+         shared_dataset.background_log_probabilities.items()},
+        {width: attach_array(shared_array) for width, shared_array in
+         shared_dataset.kmer_codes.items()})
@@ -1,8 +1,25 @@
 # Only using doctests
-import scoring, analyse, exmin, gibbs
+import scoring, analyse, exmin, gibbs, encoding, background, dataset, kernels, cli, \
+    multimotif, scan, pvalues, shared, packed, outofcore, kmers, aggregate, complexity, \
+    twostage
 import doctest
 
 doctest.testmod(scoring)
 doctest.testmod(analyse)
 doctest.testmod(exmin)
-doctest.testmod(gibbs)
\ No newline at end of file
+doctest.testmod(gibbs)
+doctest.testmod(encoding)
+doctest.testmod(background)
+doctest.testmod(dataset)
+doctest.testmod(kernels)
+doctest.testmod(cli)
+doctest.testmod(multimotif)
+doctest.testmod(scan)
+doctest.testmod(pvalues)
+doctest.testmod(shared)
+doctest.testmod(packed)
+doctest.testmod(outofcore)
+doctest.testmod(kmers)
+doctest.testmod(aggregate)
+doctest.testmod(complexity)
+doctest.testmod(twostage)
\ No newline at end of file
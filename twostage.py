@@ -0,0 +1,295 @@
+# Motif search on a subsample of the sequences, refined on all of them
+#
+# The restarts of best_of_exmin and best_of_gibbs mostly differ in where they
+# start, finding out which starts lead to a good motif doesn't need every
+# sequence. The first stage runs all restarts on a subsample, the second stage
+# only refines the best few motifs of the first stage with a few EM iterations
+# or gibbs sweeps on all sequences.
+import random
+import time
+from collections import namedtuple
+from itertools import islice
+
+import numpy
+
+from encoding import decode_sequences, encode_sequences
+from exmin import BASES, beliefs_from_counts, best_exmin_run, count_matrix, \
+    exmin, expectation_with_likelihood, get_motif_from_beliefs, \
+    iterate_exmin, most_likely_starts
+from gibbs import best_gibbs_positions, get_motifs, iterate_gibbs, \
+    sample_positions
+
+# The amount of groups of sequences with a similar GC content a stratified
+# subsample is drawn from
+STRATA = 4
+
+# A motif found by the first stage: its belief matrix (like exmin, column 0 is
+# the background) and the score of its sites on the subsample
+Candidate = namedtuple("Candidate", ["beliefs", "score"])
+
+# The outcome of a run on all sequences and of the two stages: the scores of
+# their sites (see get_sites_score), the fraction of the full score the two
+# stages kept, the seconds both took and the fraction of the time saved
+QualityReport = namedtuple("QualityReport",
+                           ["full_score", "two_stage_score", "quality_kept",
+                            "full_time", "two_stage_time", "time_saved"])
+
+
+def gc_content(encoded):
+    """
+    The fraction of C and G bases of every sequence
+    >>> gc_content(encode_sequences(["ACGT", "AAAT"])).tolist()
+    [0.5, 0.0]
+    """
+    return ((encoded == 1) | (encoded == 2)).mean(axis=1)
+
+
+def subsample(encoded, size, stratified=False):
+    """
+    Draws sequences without replacement
+    :param encoded: the encoded set of dna strings
+    :param size: the amount of sequences to draw
+    :param stratified: draw from every quarter of the sequences sorted by GC
+    content in proportion to its size, so the subsample has the same spread
+    of composition as the data
+    :return: sorted array with the indices of the drawn sequences
+
+    >>> encoded = encode_sequences(["AAAA", "AAAT", "ACGT", "CCGG"] * 2)
+    >>> subsample(encoded, 4, stratified=True).size
+    4
+    >>> sorted(gc_content(encoded[subsample(encoded, 4, stratified=True)]).tolist())
+    [0.0, 0.0, 0.5, 1.0]
+    """
+    size = min(size, len(encoded))
+    if not stratified:
+        return numpy.array(sorted(random.sample(range(len(encoded)), size)),
+                           dtype=numpy.int64)
+    strata = numpy.array_split(numpy.argsort(gc_content(encoded),
+                                             kind="stable"), STRATA)
+    sizes = [size * len(stratum) // len(encoded) for stratum in strata]
+    # The sequences left over after the proportional part go to the largest
+    # remainders
+    remainders = [size * len(stratum) % len(encoded) for stratum in strata]
+    for i in sorted(range(len(strata)), key=lambda i: -remainders[i])[
+             :size - sum(sizes)]:
+        sizes[i] += 1
+    drawn = [index for stratum, stratum_size in zip(strata, sizes)
+             for index in random.sample(list(stratum), stratum_size)]
+    return numpy.array(sorted(drawn), dtype=numpy.int64)
+
+
+def take_rows(array, indices):
+    return None if array is None else numpy.asarray(array)[indices]
+
+
+def get_sites_score(encoded, starts, motif_width, weights=None):
+    """
+    The amount of bases of the sites that match the consensus of the sites,
+    like exmin.score_motif with the consensus as motif
+    >>> get_sites_score(encode_sequences(["ACGT", "TACG", "AAAA"]), numpy.array([0, 1, 0]), 3)
+    7
+    """
+    windows = encoded[numpy.arange(len(starts))[:, None],
+                      numpy.asarray(starts)[:, None] + numpy.arange(motif_width)]
+    score = 0
+    for column in windows.T:
+        score += numpy.bincount(column, weights, minlength=BASES).max()
+    return int(score)
+
+
+def beliefs_from_starts(encoded, starts, motif_width, weights=None):
+    """
+    The belief matrix of exmin of the sites at the starts
+    """
+    hidden_variables = numpy.zeros(
+        (len(encoded), encoded.shape[1] - motif_width + 1))
+    hidden_variables[numpy.arange(len(starts)), starts] = 1
+    return beliefs_from_counts(count_matrix(encoded, hidden_variables,
+                                            motif_width, weights=weights))
+
+
+def find_candidates(encoded, motif_width, iterations, algorithm="exmin",
+                    candidates=3, background=None, eligible=None,
+                    weights=None, count=0):
+    """
+    The first stage: restarts the search multiple times and keeps the best
+    scoring motifs, a motif that is found by several restarts is kept once
+    :param encoded: the encoded subsample
+    :param iterations: the amount of restarts
+    :param algorithm: "exmin" or "gibbs"
+    :param candidates: the amount of motifs to keep
+    :return: list of Candidate from best to worst and the updated count
+    """
+    found = dict()
+    for _ in range(iterations):
+        if algorithm == "exmin":
+            hidden_variables, beliefs, count = exmin(encoded, motif_width,
+                                                     count,
+                                                     background=background,
+                                                     eligible=eligible,
+                                                     weights=weights)
+            starts = most_likely_starts(hidden_variables)
+        elif algorithm == "gibbs":
+            try:
+                starts, count = sample_positions(encoded, motif_width, count,
+                                                 background, eligible, weights)
+            except Exception as e:
+                print(e)
+                continue
+            starts = numpy.array(starts)
+            beliefs = beliefs_from_starts(encoded, starts, motif_width,
+                                          weights)
+        else:
+            raise ValueError(f"Unknown algorithm {algorithm}")
+        candidate = Candidate(beliefs, get_sites_score(encoded, starts,
+                                                       motif_width, weights))
+        consensus = get_motif_from_beliefs(beliefs, motif_width)
+        if consensus not in found or candidate.score > found[consensus].score:
+            found[consensus] = candidate
+    best = sorted(found.values(), key=lambda candidate: -candidate.score)
+    return best[:candidates], count
+
+
+def refine(encoded, beliefs, motif_width, refine_iterations=5,
+           algorithm="exmin", background=None, eligible=None, weights=None):
+    """
+    The second stage: a few EM iterations or gibbs sweeps on all sequences,
+    starting from the beliefs of a candidate
+    :param encoded: all encoded sequences
+    :param refine_iterations: the most EM iterations or gibbs sweeps
+    :return: the start position of the motif in every sequence and the amount
+    of iterations or sweeps done
+    """
+    if algorithm == "exmin":
+        states = list(islice(iterate_exmin(encoded, motif_width,
+                                           background=background,
+                                           eligible=eligible, weights=weights,
+                                           beliefs=beliefs),
+                             refine_iterations))
+        return most_likely_starts(states[-1].hidden_variables), len(states)
+    # The sweeps start from the most likely sites of the beliefs
+    hidden_variables, _ = expectation_with_likelihood(encoded, beliefs,
+                                                      motif_width, background,
+                                                      eligible)
+    states = list(islice(iterate_gibbs(encoded, motif_width, background,
+                                       eligible, weights,
+                                       positions=most_likely_starts(
+                                           hidden_variables)),
+                         refine_iterations))
+    return numpy.array(states[-1].positions), len(states)
+
+
+def two_stage_positions(sequences, motif_width, iterations=50, fraction=0.2,
+                        stratified=False, algorithm="exmin", candidates=3,
+                        refine_iterations=5, background=None, eligible=None,
+                        weights=None, count=0):
+    """
+    Searches a motif on a subsample and refines the best candidates on all
+    sequences
+    :param sequences: the set of dna strings (or the encoded set)
+    :param motif_width: the length for the motif
+    :param iterations: the amount of restarts on the subsample
+    :param fraction: the fraction of the sequences in the subsample
+    :param stratified: whether to stratify the subsample by GC content (see
+    subsample)
+    :param algorithm: "exmin" or "gibbs", for both stages
+    :param candidates: the amount of motifs of the subsample that are refined
+    :param refine_iterations: the most EM iterations or gibbs sweeps per
+    candidate on all sequences
+    :param background: log background probability of every base (e.g. from
+    Dataset.background_log_probabilities)
+    :param eligible: boolean matrix with the starting positions the motif may
+    have, all positions when not given
+    :param weights: the amount of times every sequence occurs in the data,
+    once when not given
+    :return: the start position of the motif in every sequence (None when no
+    candidate was found) and the updated count
+    """
+    encoded = encode_sequences(sequences)
+    indices = subsample(encoded, max(1, round(fraction * len(encoded))),
+                        stratified)
+    found, count = find_candidates(encoded[indices], motif_width, iterations,
+                                   algorithm, candidates,
+                                   take_rows(background, indices),
+                                   take_rows(eligible, indices),
+                                   take_rows(weights, indices), count)
+    best_score = -1
+    best_starts = None
+    for candidate in found:
+        starts, refine_count = refine(encoded, candidate.beliefs, motif_width,
+                                      refine_iterations, algorithm,
+                                      background, eligible, weights)
+        count += refine_count
+        score = get_sites_score(encoded, starts, motif_width, weights)
+        if score > best_score:
+            best_score = score
+            best_starts = starts
+    return best_starts, count
+
+
+def two_stage(sequences, motif_width, iterations=50, fraction=0.2,
+              stratified=False, algorithm="exmin", candidates=3,
+              refine_iterations=5, background=None, eligible=None,
+              weights=None):
+    """
+    Runs the two stages (see two_stage_positions), like best_of_exmin and
+    best_of_gibbs
+    :return: list of the motifs and the count
+
+    >>> random.seed(1)
+    >>> sequences = ["ACGTACGTTT", "TTACGTACGT", "GGGACGTACG", "ACGTACGCCC"] * 5
+    >>> motifs, _ = two_stage(sequences, 6, iterations=10, fraction=0.5)
+    >>> len(motifs), len(set(motifs)) <= 2
+    (20, True)
+    """
+    starts, count = two_stage_positions(sequences, motif_width, iterations,
+                                        fraction, stratified, algorithm,
+                                        candidates, refine_iterations,
+                                        background, eligible, weights)
+    if starts is None:
+        return list(), count
+    if isinstance(sequences, numpy.ndarray):
+        sequences = decode_sequences(sequences)
+    return get_motifs(list(starts), sequences, motif_width), count
+
+
+def compare_with_full(sequences, motif_width, iterations=50,
+                      algorithm="exmin", background=None, eligible=None,
+                      weights=None, **kwargs):
+    """
+    Runs the restarts on all sequences and the two stages, to see how much of
+    the quality the two stages keep for the time they save
+    :param kwargs: the options of the two stages (see two_stage_positions)
+    :return: QualityReport
+    """
+    encoded = encode_sequences(sequences)
+    time_start = time.perf_counter()
+    if algorithm == "exmin":
+        hidden_variables, _, _ = best_exmin_run(encoded, motif_width,
+                                                iterations,
+                                                background=background,
+                                                eligible=eligible,
+                                                weights=weights)
+        full_starts = None if hidden_variables is None else \
+            most_likely_starts(hidden_variables)
+    else:
+        full_starts, _ = best_gibbs_positions(encoded, motif_width, iterations,
+                                              background, eligible,
+                                              weights=weights)
+    full_time = time.perf_counter() - time_start
+
+    time_start = time.perf_counter()
+    starts, _ = two_stage_positions(encoded, motif_width, iterations,
+                                    algorithm=algorithm,
+                                    background=background, eligible=eligible,
+                                    weights=weights, **kwargs)
+    two_stage_time = time.perf_counter() - time_start
+
+    full_score = 0 if full_starts is None else get_sites_score(
+        encoded, full_starts, motif_width, weights)
+    two_stage_score = 0 if starts is None else get_sites_score(
+        encoded, starts, motif_width, weights)
+    return QualityReport(full_score, two_stage_score,
+                         two_stage_score / full_score if full_score else 1.0,
+                         full_time, two_stage_time,
+                         1 - two_stage_time / full_time)